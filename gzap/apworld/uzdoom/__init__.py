@@ -8,23 +8,26 @@ WAD.
 '''
 
 import fnmatch
+import functools
 from importlib import resources
 import jinja2
 import logging
 import os
 import random
+import re
 from typing import Dict, FrozenSet, Set
 import zipfile
 
 from BaseClasses import CollectionState, Item, ItemClassification, Location, MultiWorld, Region, Tutorial, LocationProgressType
 from Options import PerGameCommonOptions, OptionError
-from worlds.AutoWorld import World
+from worlds.AutoWorld import AutoWorldRegister, World
 import worlds.LauncherComponents as LauncherComponents
 
 from . import icons, model
 from .model.DoomItem import DoomItem
 from .model.DoomLocation import DoomLocation
 from .model.DoomWad import DoomWad
+from .model import rules
 
 VERSION = resources.read_text(__package__, "VERSION").strip()
 print(f"UZArchipelago core apworld version {VERSION}")
@@ -53,7 +56,7 @@ class UZDoomLocation(Location):
 
     def __init__(self, world, loc: DoomLocation, region: Region) -> None:
         super().__init__(player=world.player, name=loc.name(), address=loc.id, parent=region)
-        self.access_rule = loc.access_rule(world)
+        world.rule_cache.set_rule(self, loc.access_rule(world))
         self.doom_location = loc
         self.progress_type = LocationProgressType.DEFAULT
 
@@ -87,7 +90,20 @@ class UZDoomUTGlitchFlag(Item):
         super().__init__(name=self.FLAG_NAME, classification=ItemClassification.progression, code=None, player=player)
 
 
-class UZDoomWorld(World):
+@functools.lru_cache
+def glob_pattern(globs: FrozenSet[str]) -> re.Pattern:
+    '''
+    Compile a set of globs into a single regex that matches anything any of them
+    would, with the same case sensitivity as fnmatch.fnmatch().
+    '''
+    if not globs:
+        return re.compile('(?!)')
+    return re.compile('|'.join(
+        f'(?:{fnmatch.translate(os.path.normcase(glob))})'
+        for glob in sorted(globs)))
+
+
+class UZDoomWorld(*rules.backend.world_mixins, World):
     """
     UZDoom is an open-source enhanced port of the Doom engine, supporting Doom 1/2, Hexen, Heretic, and Strife, along
     with thousands of fan-made maps and mission packs and even a few commercial games like Hedon Bloodrite and Selaco.
@@ -103,8 +119,16 @@ class UZDoomWorld(World):
     hidden = True
 
     # Info fetched from UZDoom; contains item/location ID mappings etc.
+    # Wad apworlds set wad_package rather than wad_logic, so that the full logic
+    # is only loaded when a world for that wad is actually created.
     wad_logic: DoomWad
+    wad_package: str | None = None
     location_count: int = 0
+    # Names of all maps in the wad matched by starting_levels.
+    starting_map_names: FrozenSet[str]
+    # Shared location/region access rules, and the backend that builds them.
+    rule_cache: rules.RuleCache
+    rule_backend: type = rules.backend
 
     # Used by AP itself
     # These are placeholders; subclasses in the wad apworlds will populate
@@ -119,9 +143,58 @@ class UZDoomWorld(World):
     ut_can_gen_without_yaml = True
 
 
+    def __init_subclass__(cls, **kwargs):
+        # AutoWorldRegister copies the name groups into plain dicts while
+        # creating the class, which keeps the single-category groups (and adds
+        # its own, like "Everything") but loses the ability to look up composite
+        # groups like "big-secret". This runs after that, so wrap them back up,
+        # and make all_item_and_group_names agree with them so that composite
+        # groups pass option verification.
+        super().__init_subclass__(**kwargs)
+        cls.item_name_groups = model.CategoryGroups(cls.item_name_groups)
+        cls.location_name_groups = model.CategoryGroups(cls.location_name_groups)
+        cls.all_item_and_group_names = model.NamesAndGroups(cls.item_names, cls.item_name_groups)
+
     def __init__(self, multiworld: MultiWorld, player: int):
         self.location_count = 0
+        if self.wad_package:
+            if "GZAP_PARALLEL_LOAD" in os.environ:
+                self.preload_all_wads(multiworld)
+            self.wad_logic = model.init_wads(self.wad_package).wad
         super().__init__(multiworld, player)
+        self.rule_cache = self.rule_backend(self)
+
+    @staticmethod
+    def preload_all_wads(multiworld: MultiWorld):
+        '''
+        Load the logic for every wad used by any player in the multiworld, in
+        parallel. All the games are known by the time the first world is
+        created, so this only does any work the first time it's called.
+
+        GZAP_PARALLEL_LOAD may be set to the maximum number of worker processes
+        to use; if it's empty, defaults to the number of CPUs.
+        '''
+        packages = []
+        for game in multiworld.game.values():
+            world_type = AutoWorldRegister.world_types.get(game)
+            if world_type and issubclass(world_type, UZDoomWorld) and world_type.wad_package:
+                packages.append(world_type.wad_package)
+        workers = os.environ["GZAP_PARALLEL_LOAD"]
+        model.preload_wads(packages, int(workers) if workers.isdigit() else None)
+
+    def collect(self, state: CollectionState, item: Item) -> bool:
+        # Access rules may be memoized per state (see model/rules.py), so any
+        # change to our items invalidates them.
+        changed = super().collect(state, item)
+        if changed:
+            self.rule_cache.invalidate(state)
+        return changed
+
+    def remove(self, state: CollectionState, item: Item) -> bool:
+        changed = super().remove(state, item)
+        if changed:
+            self.rule_cache.invalidate(state)
+        return changed
 
     def create_item(self, name: str) -> UZDoomItem:
         if name == UZDoomUTGlitchFlag.FLAG_NAME:
@@ -134,10 +207,7 @@ class UZDoomWorld(World):
         return self.random.choices(list(self.pool.filler_items().keys()), weights=self.pool.filler_items().values())[0]
 
     def any_glob_matches(self, globs: Set[str], name: str) -> bool:
-        for glob in globs:
-            if fnmatch.fnmatch(name, glob):
-                return True
-        return False
+        return glob_pattern(frozenset(globs)).match(os.path.normcase(name)) is not None
 
     def should_include_map(self, map: str) -> bool:
         if self.options.pretuning_mode:
@@ -145,7 +215,7 @@ class UZDoomWorld(World):
         return self.any_glob_matches(self.options.included_levels.value or {"*"}, map)
 
     def is_starting_map(self, map: str) -> bool:
-        return self.any_glob_matches(self.options.starting_levels.value, map)
+        return map in self.starting_map_names
 
     def setup_item_categories(self):
         # Populate included_item_categories based on the user-friendly yaml settings.
@@ -224,6 +294,14 @@ class UZDoomWorld(World):
             map for map in self.wad_logic.maps.values()
             if self.should_include_map(map.map)
         ]
+        # These are looked up for every key item while building the pool, so
+        # work them out once now that we know which maps are included.
+        self.pool_keys = sorted({
+            key
+            for mapinfo in self.maps
+            for key in self.wad_logic.keys_for_map(mapinfo.map)
+        }, key=lambda k: f'{k.scopename} {k.tag}')
+        self.pool_keys_by_name = {key.fqin(): key for key in self.pool_keys}
 
         # Set this up after building the map list but before building the location
         # list or item pool, since it sets options that should include all locations
@@ -241,6 +319,11 @@ class UZDoomWorld(World):
         missing_target_maps = self.options.win_map_names.value - {map.map for map in self.maps}
         assert not missing_target_maps, f"Your yaml lists the following maps as win conditions, but they are not included in randomization: {missing_target_maps}"
 
+        # Access rules check this for every map they reference, so match the
+        # globs against the wad's maps once, now that the options are final.
+        self.starting_map_names = frozenset(
+            map for map in self.wad_logic.maps
+            if self.any_glob_matches(self.options.starting_levels.value, map))
         starting_maps = sorted([
                 map.map for map in self.maps
                 if self.is_starting_map(map.map)])
@@ -267,6 +350,7 @@ class UZDoomWorld(World):
         self.multiworld.regions.append(menu_region)
 
         placed = set()
+        entrances = []
 
         for map in self.maps:
             if self.is_starting_map(map.map):
@@ -286,19 +370,21 @@ class UZDoomWorld(World):
             # rather than to the menu, but we won't draw connections between them.
             # It will probably result in better behaviour from the randomizer if
             # we CAN draw these connections; something to consider.
-            menu_region.connect(
+            entrance = menu_region.connect(
                 connecting_region=regions[map.map],
-                name=f"{map.map}",
-                rule=map.access_rule(self))
+                name=f"{map.map}")
+            self.rule_cache.set_rule(entrance, map.access_rule(self))
+            entrances.append(entrance)
 
             for region in self.wad_logic.regions_in_map(map.map):
                 rg = Region(region.name(), self.player, self.multiworld)
                 regions[region.name()] = rg
                 self.multiworld.regions.append(rg)
-                regions[map.map].connect(
+                entrance = regions[map.map].connect(
                     connecting_region=rg,
-                    name=region.name(),
-                    rule=region.access_rule(self, self.wad_logic, map))
+                    name=region.name())
+                self.rule_cache.set_rule(entrance, region.access_rule(self, self.wad_logic, map))
+                entrances.append(entrance)
 
             for loc in self.pool.locations_in_map(map.map):
                 assert loc.name() not in placed, f"Location {loc.name()} was already placed but we tried to place it again!"
@@ -319,6 +405,8 @@ class UZDoomWorld(World):
                     self.location_count += 1
                 region.locations.append(location)
 
+        self.rule_cache.register_indirect_conditions(entrances)
+
     def create_items(self) -> None:
         for item in self.pool.starting_item_counts.elements():
             self.multiworld.push_precollected(self.create_item(item))
@@ -406,17 +494,10 @@ class UZDoomWorld(World):
         }
 
     def keys_in_pool(self):
-        return sorted({
-            key
-            for mapinfo in self.maps
-            for key in self.wad_logic.keys_for_map(mapinfo.map)
-        }, key=lambda k: f'{k.scopename} {k.tag}')
+        return self.pool_keys
 
     def key_in_world(self, keyname):
-        for key in self.keys_in_pool():
-            if keyname == key.fqin():
-                return key
-        return None
+        return self.pool_keys_by_name.get(keyname, None)
 
     def fill_slot_data(self):
         return self.options.as_dict(
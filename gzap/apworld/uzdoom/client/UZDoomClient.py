@@ -64,7 +64,9 @@ class UZDoomContext(SuperContext):
     def load_wad_logic(self, wad_name: str):
         for name,module in sys.modules.items():
             if name.count('.') == 1 and name.startswith('worlds.zdoom_'):
-                if module.wad.name == wad_name:
+                # Check the manifest first, so that we don't load the full logic
+                # for every installed wad just to find the one we want.
+                if module.manifest.name == wad_name:
                     logger.info(f"Loaded logic for {wad_name} from {name}: {len(module.wad.items_by_name)} items, {len(module.wad.locations_by_name)} locations.")
                     return module.wad
         raise RuntimeError(f"Couldn't find an apworld for the WAD '{wad_name}'. Make sure you have the right apworld (probably called 'zdoom_{wad_name.lower().replace(' ', '_')}.apworld' installed.)")
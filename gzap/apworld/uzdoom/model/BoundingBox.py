@@ -6,6 +6,17 @@ points within it.
 import math
 import sys
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+DIRECTIONS = ["E", "NE", "N", "NW", "W", "SW", "S", "SE"]
+# Points this close to the boundary between two directions or distances are
+# recomputed with position_name(), in case NumPy's trig rounds differently
+# from the math module's.
+EPSILON = 1e-6
+
 class BoundingBox:
   xmin: int
   ymin: int
@@ -83,3 +94,34 @@ class BoundingBox:
       return ("Center", None)
     distance = self.distance(x,y)
     return (direction,distance)
+
+  def position_names(self, points):
+    """
+    Returns position_name() for each of the given points, computed all at once
+    using NumPy if it's available.
+    """
+    if numpy is None or not points:
+      return [self.position_name(p.x, p.y) for p in points]
+
+    (cx,cy) = self.center()
+    center = self.basis_distance() * 4/10
+    edge = self.basis_distance() * 7/3
+    dx = numpy.array([p.x for p in points], dtype=numpy.float64) - cx
+    dy = numpy.array([p.y for p in points], dtype=numpy.float64) - cy
+    theta = numpy.degrees(numpy.arctan2(dy, dx)) % 360
+    d = numpy.hypot(dx, dy)
+    sector = (((theta + 22.5) % 360) // 45).astype(int)
+    boundary = (theta - 22.5) % 45
+    inexact = (
+      (boundary < EPSILON) | (boundary > 45 - EPSILON)
+      | (numpy.abs(d - center) < EPSILON) | (numpy.abs(d - edge) < EPSILON))
+
+    names = []
+    for i,p in enumerate(points):
+      if inexact[i]:
+        names.append(self.position_name(p.x, p.y))
+      elif d[i] < center:
+        names.append(("Center", None))
+      else:
+        names.append((DIRECTIONS[sector[i]], "Edge" if d[i] > edge else None))
+    return names
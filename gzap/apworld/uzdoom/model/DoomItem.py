@@ -3,11 +3,31 @@ Data model for items (or rather, item types) in Doom.
 """
 
 import sys
-from typing import Optional, Set, Dict, FrozenSet
+from typing import Optional, Set, Dict, FrozenSet, Tuple
 from BaseClasses import ItemClassification
 
+from .categories import Categorized
 
-class DoomItem:
+PROGRESSION = int(ItemClassification.progression)
+USEFUL = int(ItemClassification.useful)
+
+
+def name_field(attr: str) -> property:
+    '''
+    A property backed by attr that invalidates the object's cached name (if
+    any) when set. Used for fields that affect the output of name().
+    '''
+    def get(self):
+        return getattr(self, attr)
+
+    def set(self, value):
+        setattr(self, attr, value)
+        self._name = None
+
+    return property(get, set)
+
+
+class DoomItem(Categorized):
     """
     A (potentially randomizeable) item in the WAD.
 
@@ -24,14 +44,30 @@ class DoomItem:
     At generation time, each AP Item is derived from a DoomItem in a many-to-one
     relationship.
     """
-    id: Optional[int] = None    # AP item ID, assigned by the caller
+    __slots__ = (
+        'id', '_categories', '_category_mask', 'typename', '_tag', '_map',
+        '_disambiguate', '_name', '_classification',
+    )
+    id: Optional[int]           # AP item ID, assigned by the caller
     categories: FrozenSet[str]  # Randomization categories (e.g. key, weapon, big, small)
     typename: str               # UZDoom class name
-    tag: str                    # User-visible name *in UZDoom*
-    map: Optional[str] = None
-    disambiguate: bool = False
+    _tag: str                   # User-visible name *in UZDoom*
+    _map: Optional[str]
+    _disambiguate: bool
+    # Cached (name with scope, name without scope)
+    _name: Tuple[str,str] | None
+    # Cached classification, for items where it doesn't depend on the world
+    _classification: ItemClassification | None
+
+    tag = name_field('_tag')
+    map = name_field('_map')
+    disambiguate = name_field('_disambiguate')
 
     def __init__(self, map, category, typename, tag):
+        self.id = None
+        self._map = None
+        self._disambiguate = False
+        self._classification = None
         # 'category' comes from the logic file and is a hyphen-separated string
         self.categories = frozenset(category.split('-'))
         self.typename = typename
@@ -62,20 +98,30 @@ class DoomItem:
         If with_scope is False, returns a version without the (MAP01) suffix
         used for e.g. keys, suitable for use as part of a location name.
         """
-        name = self.tag
-        if self.disambiguate:
-            name += f" [{self.typename}]"
-        if self.map and with_scope:
-            name += f" ({self.map})"
-        return name
+        if self._name is None:
+            name = self.tag
+            if self.disambiguate:
+                name += f" [{self.typename}]"
+            self._name = (f"{name} ({self.map})" if self.map else name, name)
+        return self._name[0] if with_scope else self._name[1]
 
     def typename_for_icon(self):
         return self.typename
 
-    def has_category(self, *args):
-        return self.categories & frozenset(args)
+    def categories_changed(self) -> None:
+        super().categories_changed()
+        self._classification = None
 
     def classification(self, world=None) -> ItemClassification:
+        """
+        Returns the AP classification for this item. For most items this depends
+        only on the item's categories, so it's computed once and cached.
+        """
+        if self._classification is None:
+            self._classification = self.classification_from_categories()
+        return self._classification
+
+    def classification_from_categories(self) -> ItemClassification:
         classification = ItemClassification.filler
         if self.has_category('ap_trap'):
             classification |= ItemClassification.trap
@@ -91,11 +137,13 @@ class DoomItem:
             classification |= ItemClassification.deprioritized
         return classification
 
+    # IntFlag operations are surprisingly slow, so these test the classification
+    # bits as plain ints.
     def is_progression(self) -> bool:
-        return self.classification() & ItemClassification.progression
+        return bool(int(self.classification()) & PROGRESSION)
 
     def is_useful(self) -> bool:
-        return self.classification() & ItemClassification.useful
+        return bool(int(self.classification()) & USEFUL)
 
     def is_filler(self) -> bool:
         return not (self.is_progression() or self.is_useful())
@@ -142,6 +190,8 @@ class DoomFlag(DoomItem):
     wholly controlled by the apworld. Used for tracking or granting of randomizer
     state like "can the player access this level".
     """
+    __slots__ = ()
+
     def name(self) -> str:
         return self.tag
 
@@ -149,6 +199,7 @@ class DoomWeaponGrant(DoomFlag):
     """
     A flag that holds a weapon grant.
     """
+    __slots__ = ('weapon',)
     # Typename of the underlying weapon.
     weapon: str
 
@@ -180,7 +231,7 @@ class DoomWeaponGrant(DoomFlag):
 
         # If auto combat logic is enabled, it's required if the automatic combat
         # logic thinks it's needed.
-        if self.weapon in map.combat_logic_weapons(world):
+        if self.weapon in world.rule_cache.combat_logic_weapons(map):
             return ItemClassification.progression
 
         # Otherwise it is merely useful.
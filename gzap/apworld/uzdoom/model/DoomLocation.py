@@ -4,11 +4,12 @@ Data model for the locations items are found at in the WAD.
 
 from typing import NamedTuple, Optional, Set, List, FrozenSet, Collection, Sequence, Any
 
-from .DoomItem import DoomItem
+from .categories import Categorized
+from .DoomItem import DoomItem, name_field
 from .DoomReachable import DoomReachable
 from .DoomPosition import DoomPosition, DoomExitPosition, to_position
 
-class DoomLocation(DoomReachable):
+class DoomLocation(Categorized, DoomReachable):
     """
     A location we can perhaps randomize items into.
 
@@ -27,21 +28,33 @@ class DoomLocation(DoomReachable):
 
     At generation time, each DoomLocation results in exactly one AP Location.
     """
-    id: Optional[int] = None
-    item_name: str  # name of original item, used to name this location
+    __slots__ = (
+        'id', '_categories', '_category_mask', 'pos', '_region', 'item',
+        'parent', 'orig_item', '_disambiguation', '_custom_name', '_name',
+        'spawn_filter', 'secret_id',
+    )
+    id: Optional[int]
     categories: FrozenSet[str]
-    pos: DoomPosition | None = None
-    region: str | None  = None
-    item: DoomItem | None = None  # Used for place_locked_item
-    parent = None  # The enclosing DoomWad
-    orig_item = None
-    disambiguation: str = None
-    custom_name: str = None
-    spawn_filter: int = 0
-    secret_id: int = 0  # used for sector IDs and TIDs
+    pos: DoomPosition | None
+    _region: str | None
+    item: DoomItem | None  # Used for place_locked_item
+    parent: Any  # The enclosing DoomWad
+    orig_item: DoomItem | None
+    _disambiguation: str | None
+    _custom_name: str | None
+    # Cached result of name()
+    _name: str | None
+    spawn_filter: int
+    secret_id: int  # used for sector IDs and TIDs
 
     def __init__(self, parent, item: DoomItem, secret: bool, pos: Sequence[Any], spawn_filter: int = 0xFF, custom_name: str | None = None):
         super().__init__()
+        self.id = None
+        self._region = None
+        self.item = None
+        self.orig_item = None
+        self._disambiguation = None
+        self.secret_id = 0
         self.parent = parent
         self.categories = frozenset(['secret']) if secret else frozenset()
         self.spawn_filter = spawn_filter
@@ -53,6 +66,10 @@ class DoomLocation(DoomReachable):
             self.orig_item = item
         self.pos = to_position(*pos)
 
+    region = name_field('_region')
+    disambiguation = name_field('_disambiguation')
+    custom_name = name_field('_custom_name')
+
     def __str__(self) -> str:
         return f"DoomLocation#{self.id}({self.name()} @ {self.pos} % {self.prereqs})"
 
@@ -68,21 +85,48 @@ class DoomLocation(DoomReachable):
         # is a key and a "Blue Key" that is not a key at the same coordinates.
         # I suspect this will never arise in practice.
         # If it does, future me, I am sorry, but also, wtf?
-        if self.region:
-            name = f"{self.pos.map} {self.region} - {self.custom_name or self.orig_item.name(False)}"
-        else:
-            name = f"{self.pos.map} - {self.custom_name or self.orig_item.name(False)}"
-        if self.disambiguation:
-            name += f" [{self.disambiguation}]"
-        return name
+        # The name is cached, and invalidated when any of the fields that go
+        # into it change.
+        if self._name is None:
+            if self.region:
+                name = f"{self.pos.map} {self.region} - {self.custom_name or self.orig_item.name(False)}"
+            else:
+                name = f"{self.pos.map} - {self.custom_name or self.orig_item.name(False)}"
+            if self.disambiguation:
+                name += f" [{self.disambiguation}]"
+            self._name = name
+        return self._name
+
+    def invalidate_name(self) -> None:
+        """
+        Discard the cached name. Setting region, disambiguation, or custom_name
+        does this automatically; this is for when the original item is renamed.
+        """
+        self._name = None
+
+    def index_key(self) -> tuple:
+        """
+        Key used to detect duplicate locations: two locations at the same
+        position that originally held the same actor type are the same location.
+        """
+        return (self.pos, self.orig_item and self.orig_item.typename)
+
+    def matches_tuning_name(self, name: str) -> bool:
+        """
+        True if name, the location name from a tuning record, plausibly refers
+        to this location: i.e. it names the same item, possibly by its typename
+        or an older version of its name, ignoring any disambiguation suffix.
+        """
+        label = name.split(' - ', 1)[-1]
+        candidates = {self.custom_name}
+        if self.orig_item:
+            candidates |= {self.orig_item.typename, self.orig_item.tag, self.orig_item.name(False)}
+        return label in candidates or label.rsplit(' [', 1)[0] in candidates
 
     def fqin(self, item: str) -> str:
         """Return the fully qualified item name for an item scoped to this location's map."""
         return f"{item} ({self.pos.map})"
 
-    def has_category(self, *args):
-        return self.categories & frozenset(args)
-
     def is_default_enabled(self, include_secrets: bool = False) -> bool:
         if self.unreachable:
             return False
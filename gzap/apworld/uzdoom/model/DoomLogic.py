@@ -14,9 +14,9 @@ World subclass is even instantiated; well before we have access to the yaml.)
 """
 
 from dataclasses import dataclass, field
-from itertools import chain, combinations
 from typing import Dict, List, Set
 
+from .categories import CategoryGroups
 from .DoomItem import DoomItem
 from .DoomLocation import DoomLocation
 from .DoomWad import DoomWad
@@ -26,9 +26,9 @@ class DoomLogic:
     last_id: int = 0
     wad: DoomWad = None
     item_names_to_ids: Dict[str,int] = field(default_factory=dict)
-    item_categories_to_names: Dict[str, Set[str]] = field(default_factory=dict)
+    item_categories_to_names: CategoryGroups = field(default_factory=CategoryGroups)
     location_names_to_ids: Dict[str,int] = field(default_factory=dict)
-    location_categories_to_names: Dict[str, Set[str]] = field(default_factory=dict)
+    location_categories_to_names: CategoryGroups = field(default_factory=CategoryGroups)
 
     def next_id(self) -> int:
         self.last_id += 1
@@ -44,14 +44,6 @@ class DoomLogic:
         assert self.wad is None
         self.wad = wad
 
-    def all_subcategory_strings(self, cats):
-        cats = list(cats)
-        return (
-            '-'.join(sorted(subcats))
-            for subcats in chain.from_iterable(
-                combinations(cats, i) for i in range(1, len(cats)+1))
-        )
-
     def register_item(self, item: DoomItem) -> int:
         """
         Register an item and return its assigned ID.
@@ -67,8 +59,7 @@ class DoomLogic:
         if name not in self.item_names_to_ids:
             self.item_names_to_ids[name] = self.next_id()
         item.id = self.item_names_to_ids[name]
-        for cat in self.all_subcategory_strings(item.categories):
-            self.item_categories_to_names.setdefault(cat, set()).add(name)
+        self.item_categories_to_names.add(name, item.categories)
         return item.id
 
     def register_location(self, loc: DoomLocation):
@@ -76,6 +67,5 @@ class DoomLogic:
         if name not in self.location_names_to_ids:
             self.location_names_to_ids[name] = self.next_id()
         loc.id = self.location_names_to_ids[name]
-        for cat in self.all_subcategory_strings(loc.categories):
-            self.location_categories_to_names.setdefault(cat, set()).add(name)
+        self.location_categories_to_names.add(name, loc.categories)
         return loc.id
@@ -9,12 +9,12 @@ weapons it contains.
 from collections import Counter
 from dataclasses import dataclass, field, InitVar
 from math import ceil
-from typing import Dict, List, NamedTuple, Optional, Set, Type
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Type
 
 from .DoomLocation import DoomLocation
 from .DoomKey import DoomKey
 from .DoomReachable import DoomReachable
-from .prereqs import weapon_prereq, strings_to_prereq_fn, weapon_from_hint, is_combat_logic_hint
+from .prereqs import weapon_from_hint, is_combat_logic_hint
 
 class MAPINFO(NamedTuple):
     """
@@ -36,7 +36,7 @@ class MAPINFO(NamedTuple):
     flags: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class DoomMap:
     """
     Information about a level (or, equivalently, a map) in the WAD.
@@ -78,6 +78,8 @@ class DoomMap:
     key_count: int = 0
     # All locations contained in this map
     locations: List[DoomLocation] = field(default_factory=list)
+    # The same locations, indexed by (position, typename of original item).
+    location_index: Dict[Tuple[Any,str|None],DoomLocation] = field(default_factory=dict, repr=False)
     # Items not contained in any particular location that should nonetheless
     # be added to the pool if this map is included in play.
     loose_items: Dict[str,int] = field(default_factory=dict)
@@ -92,6 +94,10 @@ class DoomMap:
         self.extra_rules.add_universal_prereqs(self.prereqs)
 
     def all_locations(self, spawn_filter: int, categories: Set[str]) -> List[DoomLocation]:
+        if self.wad.location_table:
+            return self.wad.location_table.select(
+                [self.map], spawn_filter=spawn_filter or 0, categories=categories)
+
         if not spawn_filter:
             # Return all locations regardless of filter.
             return [loc for loc in self.locations if not categories or loc.has_category(*categories)]
@@ -102,6 +108,10 @@ class DoomMap:
         ]
 
     def default_enabled_location_count(self, spawn_filter: int = 0x08):
+        if self.wad.location_table:
+            return self.wad.location_table.count(
+                self.map, spawn_filter=spawn_filter, default_enabled=True)
+
         return len([
             loc for loc in self.locations
             if spawn_filter & loc.spawn_filter and loc.is_default_enabled()
@@ -109,49 +119,7 @@ class DoomMap:
 
     def access_rule(self, world):
         # print(f"access_rule({self.map}) = start={world.is_starting_map(self.map)}, co-guns({world.options.carryover_weapon_bias.value})={self.carryover_gunset}, local-guns({world.options.local_weapon_bias.value})={self.local_gunset}, clears({world.options.level_order_bias.value})={self.prior_clears}")
-        combat_logic_weapons = self.combat_logic_weapons(world)
-        combat_logic_rule = strings_to_prereq_fn(
-            world, world.wad_logic, self,
-            [f'weapon/{weapon}/need' for weapon in combat_logic_weapons])
-
-        if self.extra_rules.prereqs:
-            extra_rule = self.extra_rules.access_rule(world, self.wad, self)
-        else:
-            extra_rule = lambda _: True
-
-        def rule(state):
-            if world.options.pretuning_mode:
-                return True
-
-            if not state.has(self.access_flag_name(), world.player):
-                return False
-
-            if not extra_rule(state):
-                return False
-
-            # Starting levels are exempt from all balancing checks.
-            # TODO: we should be better about this, exclude rank 0 levels from
-            # carryover checks but still apply them to later starting levels
-            # if possible.
-            if world.is_starting_map(self.map):
-                return True
-
-            # If Universal Tracker is asking for "glitch logic", skip all balancing
-            # checks and report everything the player can get to whether they have
-            # the firepower to keep it or not.
-            if state.has(world.glitches_item_name, world.player):
-                return True
-
-            # If hublogic is on, skip per-map weapon logic.
-            if self.wad.use_hub_logic():
-                return True
-
-            if not combat_logic_rule(state):
-                return False
-
-            return True
-
-        return rule
+        return world.rule_cache.map_rule(self)
 
     def access_flag_name(self):
         if self.levelname:
@@ -180,13 +148,23 @@ class DoomMap:
         else:
             return {self.access_flag_name()}
 
-    def register_location(self, loc: DoomLocation) -> None:
-        if loc in self.locations:
-            return
-
+    def register_location(self, loc: DoomLocation) -> bool:
+        """
+        Add a location to this map. Returns True if it was added, or False if
+        there was already a location at the same position containing the same
+        actor type, in which case the existing location's spawn_filter is
+        updated to include this one's instead.
+        """
+        other = self.location_index.get(loc.index_key())
+        if other is not None:
+            other.spawn_filter |= loc.spawn_filter
+            return False
+
+        self.location_index[loc.index_key()] = loc
         self.locations.append(loc)
         if loc.has_category('key'):
             self.key_count += 1
+        return True
 
     def has_one_key(self, keyname: str) -> bool:
         return self.key_count == 1 and keyname in {k.fqin() for k in self.keyset}
@@ -216,7 +194,7 @@ class DoomMap:
     def prior_weapons(self, world) -> Counter[str]:
         weapons = Counter()
         for map in self.prior_maps(world):
-            weapons += map.local_weapons(world)
+            weapons += world.rule_cache.local_weapons(map)
         return weapons
 
     def combat_logic_weapons(self, world):
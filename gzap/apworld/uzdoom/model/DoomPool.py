@@ -83,20 +83,17 @@ class DoomPool:
         be randomized based on yaml settings. Locations are sorted into normal
         and forced-vanilla locations. Items are added to the item pool and,
         optionally, to the starting inventory pool.
+
+        The caller is responsible for leaving out unreachable locations.
         '''
         if world is None:
-            self.locations = [loc for loc in all_locations if not loc.unreachable]
+            self.locations = list(all_locations)
             self.add_items_to_pool(self.item_counts, self.locations)
             return
 
         buckets = {}
         for loc in all_locations:
-            # Unreachable locations should be completely dropped from the
-            # location set, as otherwise in a WAD with a large number of
-            # unreachables it affects hint cost calculation badly.
-            # TODO: once we implement tuning-only checks not visible to AP, we
-            # should make unreachables a type of tuning-only check.
-            if self._skip_in_pretuning(world, loc) or loc.unreachable:
+            if self._skip_in_pretuning(world, loc):
                 continue
             bucket = world.options.included_item_categories.bucket_for_location(loc)
             buckets.setdefault(bucket, []).append(loc)
@@ -1,7 +1,31 @@
-from typing import NamedTuple, Optional, Set, List, FrozenSet, Collection
+from typing import NamedTuple, Optional, Set, List, FrozenSet, Collection, Tuple
 
 from . import prereqs
 
+def minimize_keysets(keysets) -> FrozenSet[FrozenSet[str]]:
+    """
+    Reduce an or-of-ands of keysets to its minimal form, i.e. the antichain of
+    keysets that aren't a proper superset of any other keyset.
+
+    Each distinct prereq is assigned a bit, so each keyset becomes an int and
+    subset tests are just bitwise ands. Once the keysets are sorted by size, a
+    keyset can only be a superset of the ones before it, so we can build the
+    antichain in a single pass.
+    """
+    bits = {}
+    masks = {}
+    for keyset in keysets:
+        mask = 0
+        for prereq in keyset:
+            mask |= 1 << bits.setdefault(prereq, len(bits))
+        masks.setdefault(mask, keyset)
+
+    minimal = []
+    for mask in sorted(masks, key=int.bit_count):
+        if not any(other & mask == other for other in minimal):
+            minimal.append(mask)
+    return frozenset(frozenset(masks[mask]) for mask in minimal)
+
 class DoomReachable:
     """
     A class for things that we can reach in-game, with rules about when it is
@@ -13,19 +37,24 @@ class DoomReachable:
     superclass for Maps but Maps are complicated inside and were originally
     written without this commonality of functionality in mind.
     """
+    __slots__ = ('prereqs', 'tuning', 'unreachable', 'debug_name')
     # Or-of-ands of prerequisites needed to access this place, in the format
     # described in regions.md.
-    prereqs: FrozenSet[FrozenSet[str]] | None = None
+    prereqs: FrozenSet[FrozenSet[str]] | None
     # Unprocessed tuning data read from the tuning file and not yet turned into
-    # prereqs.
-    tuning: List[FrozenSet[str]]
+    # prereqs. Most things have no tuning, so this is a tuple rather than a
+    # list to avoid allocating an empty list for each of them.
+    tuning: Tuple[FrozenSet[str],...]
     # Unreachability flag.
-    unreachable: bool = False
+    unreachable: bool
     # For debugging
-    debug_name: str = '<unknown reachable>'
+    debug_name: str
 
-    def __init__(self):
-        self.tuning = []
+    def __init__(self, debug_name: str = '<unknown reachable>'):
+        self.prereqs = None
+        self.tuning = ()
+        self.unreachable = False
+        self.debug_name = debug_name
 
     def name(self):
         return self.debug_name
@@ -41,14 +70,14 @@ class DoomReachable:
         Record a single tuning record for this location. This won't be turned into
         actual reachability logic until all logic and tuning has been loaded.
 
-        The tuning data is stored as a list of sets of requirement strings.
+        The tuning data is stored as a sequence of sets of requirement strings.
         Once all tuning data is loaded, it gets minimized (redundant sets pruned)
         and turned into actual evaluatable requirements.
         """
         if unreachable is not None:
             self.unreachable = unreachable
         if keys is not None:
-            self.tuning.append(frozenset(k if '/' in k else 'key/'+k for k in keys))
+            self.tuning += (frozenset(k if '/' in k else 'key/'+k for k in keys),)
 
     def finalize_tuning(self, default):
         """
@@ -56,18 +85,9 @@ class DoomReachable:
 
         If there is no tuning data, use default.
         """
-        keysets = set()
-        for tuning in self.tuning or default:
-            # Remove all keysets we've seen so far that the tuning is a proper
-            # subset of
-            keysets = set(ks for ks in keysets if not (tuning < ks))
-            # Add the new keyset iff there is no existing keyset that it is a
-            # proper superset of.
-            if not frozenset(ks for ks in keysets if ks < tuning):
-                keysets.add(frozenset(tuning))
-
+        keysets = minimize_keysets(self.tuning or default)
         # print(f'Tuning {self}: optimizing {self.tuning} -> {keysets}')
-        self.prereqs = frozenset(keysets)
+        self.prereqs = keysets
 
     def add_universal_prereqs(self, prereqs):
         if not self.prereqs:
@@ -98,49 +118,9 @@ class DoomReachable:
 
     def access_rule(self, world, wad, map):
         """
-        Convert the string-based requirements in self.keys into a callable rule
-        evaluator for use by the logic engine.
+        Convert the string-based requirements in self.keys into an access rule
+        for use by the logic engine. The rule itself is built by the world's
+        rule cache (see rules.py), and shared with everything else in the same
+        map that has the same prereqs; apply it with the rule cache's set_rule().
         """
-        prereq_fns = [
-            prereqs.strings_to_prereq_fn(world, wad, map, ps)
-            for ps in self.prereqs
-        ]
-
-        def rule(state):
-            if hasattr(world.multiworld, "generation_is_fake"):
-                # If Universal Tracker is generating, pretend that locations
-                # with the unreachable flag are unreachable always, so they
-                # don't show up in the tracker.
-                if self.unreachable:
-                    return False
-                # Also consider everything unreachable in pretuning mode, because
-                # in pretuning the idea of "logic" kind of goes out the window
-                # entirely.
-                if world.options.pretuning_mode:
-                    return False
-
-            # Skip all checks in pretuning mode -- we know that the logic is
-            # beatable because it's the vanilla game.
-            if world.options.pretuning_mode:
-                return True
-
-            # If this location has no prerequisites, trivially succeed.
-            if not prereq_fns:
-                return True
-
-            # Prereqs is an or-of-ands, so if any prereq succeeds, the rule
-            # succeeds.
-            for fn in prereq_fns:
-                if fn(state):
-                    return True
-
-            # If keys are forced to be in vanilla locations, assume that all
-            # items are reachable since key-based progression will work as normal.
-            # TODO: replace with a more sophisticated check that confirms that
-            # *all* items we have as prereqs have vanilla location placement.
-            if world.options.included_item_categories.all_keys_are_vanilla:
-                return True
-
-            return False
-
-        return rule
+        return world.rule_cache.reachable_rule(self, wad, map)
@@ -1,14 +1,14 @@
 from .DoomReachable import DoomReachable
 
 class DoomRegion(DoomReachable):
+  __slots__ = ('map', 'subregion')
   map: str
   subregion: str
 
   def __init__(self, map, subregion):
+    super().__init__(f'map/{map}/{subregion}')
     self.map = map
     self.subregion = subregion
-    self.debug_name = f'map/{self.map}/{self.subregion}'
-    super().__init__()
 
   def record_tuning(self, keys):
     # Implicit dependency on the enclosing map.
@@ -19,3 +19,8 @@ class DoomRegion(DoomReachable):
 
   def name(self) -> str:
     return f'{self.map}/{self.subregion}'
+
+  def access_rule(self, world, wad, map):
+    # Regions are referenced from many places, so their rules are shared via
+    # the world's rule registry rather than built per reference.
+    return world.rule_cache.region_rule(self, wad, map)
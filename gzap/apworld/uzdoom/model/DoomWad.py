@@ -13,6 +13,7 @@ to keep track of:
 
 import sys
 
+from collections import Counter
 from dataclasses import dataclass, field, InitVar
 from typing import Any, Dict, List, Set, FrozenSet, Tuple, Iterable
 
@@ -24,6 +25,10 @@ from .DoomPosition import DoomPosition, DoomCoordPosition, to_position
 from .DoomMap import DoomMap
 from .DoomKey import DoomKey
 from .DoomRegion import DoomRegion
+from .LocationTable import LocationTable
+from .SpatialIndex import SpatialIndex, tuning_tolerance
+from .records import ItemRecord, MapRecord, SecretRecord
+from .prereqs import PrereqTable
 
 
 class DuplicateMapError(RuntimeError):
@@ -50,12 +55,27 @@ class DoomWad:
     locations_by_name: Dict[str, DoomLocation] = field(default_factory=dict)
     # Map of FQIN -> key record
     keys_by_name: Dict[str,DoomKey] = field(default_factory=dict)
+    # Map of map name -> keys valid in that map, and map name -> typename -> keys
+    # of that type valid in that map. Built by finalize_key_items.
+    keys_by_map: Dict[str,FrozenSet[DoomKey]] = field(default_factory=dict)
+    key_types_by_map: Dict[str,Dict[str,FrozenSet[DoomKey]]] = field(default_factory=dict)
     # Tuning data is being loaded, or has been loaded, for this wad.
     tuned: bool = False
     # Flags passed through from the tuning file
     flags: Dict[str,Any] = field(default_factory=dict)
     # Implicit and explicit regions. Minimum one per map, but there might be more.
     regions: Dict[str,DoomRegion] = field(default_factory=dict)
+    # Interned prereq terms shared by all of the above.
+    prereq_terms: PrereqTable = field(default_factory=PrereqTable)
+    # Columnar copy of the locations for fast filtering, if NumPy is available.
+    # Built by finalize_tuning.
+    location_table: LocationTable | None = field(default=None, repr=False)
+    # Index of location positions for matching tuning records that don't line up
+    # exactly with any location. Built on demand while loading tuning and
+    # discarded once it's finalized.
+    spatial_index: SpatialIndex | None = field(default=None, repr=False)
+    # Number of tuning records that didn't match any location.
+    stale_tuning: int = 0
 
     def set_flags(self, flag_strings: List[str]):
         self.flags = {}
@@ -94,9 +114,12 @@ class DoomWad:
         return (loc for map in self.maps.values() for loc in map.locations)
 
     def locations_for_stats(self, spawn_filter: int, include_secrets: bool = False) -> Iterable[DoomLocation]:
+        if self.location_table:
+            return self.location_table.select(
+                spawn_filter=spawn_filter, default_enabled=True, include_secrets=include_secrets, reachable=True)
         return (
             loc for map in self.maps.values() for loc in map.all_locations(spawn_filter, {})
-            if loc.is_default_enabled(include_secrets)
+            if loc.is_default_enabled(include_secrets) and not loc.unreachable
         )
 
     def location_named(self, name: str) -> DoomLocation:
@@ -140,12 +163,19 @@ class DoomWad:
         instead it uses fill_pool to produce a suitable subset of the WAD which
         it can then inspect and manipulate.
         """
-        locations = []
-        for map in world.maps:
-            if world.options.pretuning_mode:
-                locations += map.all_locations(None, {})
-            else:
-                locations += map.all_locations(world.spawn_filter, {})
+        spawn_filter = None if world.options.pretuning_mode else world.spawn_filter
+        # Unreachable locations should be completely dropped from the location
+        # set, as otherwise in a WAD with a large number of unreachables it
+        # affects hint cost calculation badly.
+        # TODO: once we implement tuning-only checks not visible to AP, we
+        # should make unreachables a type of tuning-only check.
+        if self.location_table:
+            locations = self.location_table.select(
+                [map.map for map in world.maps], spawn_filter=spawn_filter, reachable=True)
+        else:
+            locations = []
+            for map in world.maps:
+                locations += [loc for loc in map.all_locations(spawn_filter, {}) if not loc.unreachable]
         pool = DoomPool(self, locations, world)
         return pool
 
@@ -237,12 +267,16 @@ class DoomWad:
             return None
         return sorted(map.map for map in maps)
 
-    def new_map(self, json: Dict[str,str]) -> None:
-        map = json["map"]
+    def new_map(self, record: MapRecord) -> None:
+        map = record.map
         if map in self.maps:
             raise DuplicateMapError(map)
 
-        self.maps[map] = DoomMap(wad=self, **json)
+        self.maps[map] = DoomMap(
+            wad=self, map=record.map, checksum=record.checksum, info=record.info,
+            levelname=record.levelname, episodename=record.episodename,
+            clustername=record.clustername, monster_count=record.monster_count,
+            monsters=record.monsters, prereqs=record.prereqs, rank=record.rank)
         self.register_map_flags(self.maps[map])
 
     def register_map_flags(self, map: DoomMap):
@@ -289,24 +323,7 @@ class DoomWad:
         map_exit.orig_item = None
         self.register_location(map_exit)
 
-    def filter_from_json(self, json: Dict[str,str]) -> int:
-        assert not ("skill" in json and "filter" in json), "Logic entry found with both `skill` and `filter` fields"
-        if "filter" in json:
-            return json.pop("filter")
-        elif "skill" in json:
-            skill = json.pop("skill")
-            filter = 0
-            if 1 in skill:
-                filter |= 0x03 # ITYTD and HNTR
-            if 2 in skill:
-                filter |= 0x04 # HMP
-            if 3 in skill:
-                filter |= 0x18 # UV and NM
-            return filter
-        else:
-            return 0xFF
-
-    def new_item(self, json: Dict[str,str]) -> None:
+    def new_item(self, record: ItemRecord) -> None:
         """
         Add a new item to the item pool, and its position to the location pool.
 
@@ -314,18 +331,11 @@ class DoomWad:
         we just increment the count on the existing entry. The item's location is added to the location pool
         using the item's name as a disambiguator.
         """
-        # Extract the position information for addition to the location table.
-        pos = json.pop("pos")
-        spawn_filter = self.filter_from_json(json)
-        secret = json.pop("secret", False)
-        name = json.pop("name", None)
-        tid = json.pop("tid", None)
-
         # We add everything in the logic file to the pool. Not everything will
         # necessarily be used in randomization, but we need to do this at load
         # time, before we know what item categories the user has requested.
-        item = self.register_item(DoomItem(pos[0], **json))
-        self.new_location(item, secret, spawn_filter, pos, name)
+        item = self.register_item(DoomItem(record.pos[0], record.category, record.typename, record.tag))
+        self.new_location(item, record.secret, record.spawn_filter(), record.pos, record.name)
 
     def register_item(self, item: DoomItem) -> DoomItem:
         assert not self.tuned, f"AP-ITEM found in tuning data for {self.name} -- make sure you don't have a logic file mixed in with the tuning."
@@ -358,6 +368,10 @@ class DoomWad:
                 all_items[item.name()] = item
         self.items_by_name = all_items
         self.items_by_type = { item.typename: item for item in self.items() }
+        # Location names include the names of the items they originally held,
+        # some of which may have just changed.
+        for loc in self.all_locations():
+            loc.invalidate_name()
 
     def define_region(self, map: str, keys: List[str], region: str = None):
         if not region:
@@ -389,26 +403,18 @@ class DoomWad:
         assert not self.tuned, f"AP-LOCATION found in tuning data for {self.name} -- make sure you don't have a logic file mixed in with the tuning."
 
         # If there's an existing location at these coordinates containing the
-        # same actor type, just update the spawn_filter of the existing one.
-        # (The scanner should do this automatically but some older logic files
-        # may have multiple entries for the same (type,pos) that need to be
-        # merged post hoc).
-        for loc in self.locations_at_position(location.pos):
-            if loc.orig_item.typename == location.orig_item.typename:
-                # Same position, same typename. Merge this item with the other
-                # one by updating its spawn_filter.
-                loc.spawn_filter |= location.spawn_filter
-                return
-
+        # same actor type, the map will just update the spawn_filter of the
+        # existing one. (The scanner should do this automatically but some older
+        # logic files may have multiple entries for the same (type,pos) that need
+        # to be merged post hoc).
         # Otherwise, either this is the first location at that position, or it's
         # the first one at that position holding this actor type.
-        self.locations_by_pos.setdefault(location.pos, []).append(location)
-        self.maps[location.pos.map].register_location(location)
+        if self.maps[location.pos.map].register_location(location):
+            self.locations_by_pos.setdefault(location.pos, []).append(location)
 
-    def new_secret(self, json: Dict[str, Any]) -> None:
+    def new_secret(self, record: SecretRecord) -> None:
         assert not self.tuned, f"AP-SECRET found in tuning data for {self.name} -- make sure you don't have a logic file mixed in with the tuning."
-        spawn_filter = self.filter_from_json(json)
-        location = DoomLocation(self, item=None, secret=True, pos=json['pos'], spawn_filter=spawn_filter, custom_name=json.get('name', None))
+        location = DoomLocation(self, item=None, secret=True, pos=record.pos, spawn_filter=record.spawn_filter(), custom_name=record.name)
         if location.pos.secret_type == 'sector':
             location.custom_name = f"Secret {location.pos.secret_id}"
             location.categories = frozenset({'secret', 'sector'})
@@ -432,15 +438,14 @@ class DoomWad:
         else:
             self.keys_by_name[key.fqin()] = key
 
-    def keys_for_map(self, mapname):
-        return frozenset(
-            key for key in self.keys_by_name.values()
-            if mapname in key.maps)
+    def keys_for_map(self, mapname) -> FrozenSet[DoomKey]:
+        return self.keys_by_map.get(mapname, frozenset())
 
     def reify_keys(self, mapname, keytypes):
+        types = self.key_types_by_map.get(mapname, {})
         keys = frozenset(
-            key for key in self.keys_for_map(mapname)
-            if key.typename in keytypes)
+            key for keytype in keytypes
+            for key in types.get(keytype, ()))
         assert len(keys) == len(keytypes), f"Error reifying keys for {mapname}: wanted {keytypes}, but the logic only contains {[key.fqin() for key in keys]}"
         return keys
 
@@ -464,7 +469,30 @@ class DoomWad:
             return
 
         pos = to_position(*pos)
-        self.record_tuning(self.locations_at_position(pos), keys, region, unreachable)
+        locs = self.locations_at_position(pos)
+        if not locs and type(pos) is DoomCoordPosition:
+            locs = self.nearest_locations(pos, name)
+        if not locs:
+            self.stale_tuning += 1
+        self.record_tuning(locs, keys, region, unreachable)
+
+    def nearest_locations(self, pos: DoomCoordPosition, name: str) -> List[DoomLocation]:
+        """
+        Find the location a tuning record refers to when there's nothing at its
+        exact position, e.g. because the item moved slightly between scans: the
+        closest location within the tuning tolerance that held the same item.
+        Every such match is reported, since the tuning may need updating.
+        """
+        tolerance = tuning_tolerance()
+        if not tolerance:
+            return []
+        if self.spatial_index is None:
+            self.spatial_index = SpatialIndex(self.all_locations(), tolerance)
+        for distance,loc in self.spatial_index.nearby(pos, tolerance):
+            if loc.matches_tuning_name(name):
+                print(f"Tuning for '{name}' at {pos.as_vec3()} applied to '{loc.name()}' at {loc.pos.as_vec3()}, {distance:.1f} units away.")
+                return [loc]
+        return []
 
     def disambiguate_duplicate_locations(self) -> None:
         # Resolve name collisions among locations and register them with the logic.
@@ -498,50 +526,56 @@ class DoomWad:
             if type(loc.pos) is DoomCoordPosition:
                 bb.add_point(loc.pos)
 
-        bins = self.bin_locations_by(map.locations, lambda loc: loc.name())
+        bins = [
+            bin for bin in self.bin_locations_by(map.locations, lambda loc: loc.name()).values()
+            if len(bin) > 1
+        ]
+        if not bins:
+            return
+
+        # Work out compass positions for every location that needs them in one
+        # go, since that's much faster than doing it one by one.
+        positions = bb.position_names([loc.pos for bin in bins for loc in bin])
 
         # We do each bin separately, so that for a given name, we end up at the
         # same fallback for every location of that name, rather than (say) a mix
         # of coordinates for some soulspheres and compass directions for others.
-        for bin in bins.values():
-            if len(bin) > 1:
-                self.disambiguate_bin(bb, bin)
-
-    def disambiguate_bin(self, bb, locs):
-        # Bins contains all locations that had name collisions. First, try binning
-        # by coarse direction and distance. In many maps this suffices for armour,
-        # powerups, etc.
-        def binner(loc):
-            dir,dist = bb.position_name(loc.pos.x, loc.pos.y)
-            oldname = loc.name()
-            if dist:
-                loc.disambiguation = f"{dir} {dist}"
-            else:
-                loc.disambiguation = dir
-            # print(f"Renaming {oldname} -> {loc.name()}")
-            return loc.name()
-
-        bins = self.bin_locations_by(locs, binner)
-        if len(bins) == 0:
-            return
-
-        # That didn't work, so try again with coordinates.
-        def binner(loc):
-            oldname = loc.name()
-            loc.disambiguation = f"{int(loc.pos.x)},{int(loc.pos.y)}"
-            # print(f"Renaming {oldname} -> {loc.name()}")
-            return loc.name()
-
-        bins = self.bin_locations_by([loc for bin in bins.values() for loc in bin], binner)
-        if len(bins) == 0:
-            return
-
-        # If we get here, the binner couldn't fully disambiguate things even
-        # with XY coordinates. Add a Z coordinate to anything that's left.
-        for loc in [loc for bin in bins.values() for loc in bin if len(bin) > 1]:
-            oldname = loc.name()
-            loc.disambiguation = f"{int(loc.pos.x)},{int(loc.pos.y)},{int(loc.pos.z)}"
-            # print(f"Renaming {oldname} -> {loc.name()}")
+        start = 0
+        for bin in bins:
+            self.disambiguate_bin(positions[start:start+len(bin)], bin)
+            start += len(bin)
+
+    def disambiguate_bin(self, positions, locs):
+        # Locs contains all locations that had name collisions, all of which have
+        # the same name. First, try telling them apart by coarse direction and
+        # distance. In many maps this suffices for armour, powerups, etc.
+        labels = [f"{dir} {dist}" if dist else dir for dir,dist in positions]
+        if len(set(labels)) < len(labels):
+            # That didn't work, so try again with coordinates.
+            labels = [f"{int(loc.pos.x)},{int(loc.pos.y)}" for loc in locs]
+            counts = Counter(labels)
+            # If that still doesn't fully disambiguate things, add a Z
+            # coordinate to anything that's left.
+            labels = [
+                label if counts[label] == 1 else f"{label},{int(loc.pos.z)}"
+                for label,loc in zip(labels, locs)
+            ]
+
+        for label,loc in zip(labels, locs):
+            loc.disambiguation = label
+
+    def intern_prereqs(self) -> None:
+        """
+        Replace the prereqs of every location, region, and map with interned
+        copies, so that each distinct prereq is parsed only once and identical
+        requirements are shared rather than duplicated.
+        """
+        for loc in self.all_locations():
+            loc.prereqs = self.prereq_terms.intern(loc.prereqs)
+        for region in self.regions.values():
+            region.prereqs = self.prereq_terms.intern(region.prereqs)
+        for map in self.maps.values():
+            map.extra_rules.prereqs = self.prereq_terms.intern(map.extra_rules.prereqs)
 
     def finalize_logic(self, logic) -> None:
         """
@@ -562,18 +596,24 @@ class DoomWad:
         just impose some requirements, like: you can't AP-CHECK a location until
         after its AP-ITEM, and you can't reference a key until after its AP-KEY.
         """
+        self.spatial_index = None
+        if self.stale_tuning:
+            print(f"{self.name}: {self.stale_tuning} tuning records didn't match any location and were ignored.")
         for loc in self.all_locations():
             loc.finalize_tuning(self.regions.get(f'{loc.pos.map}/{loc.region}', None))
         for name,region in self.regions.items():
             region.finalize_tuning(default=[])
         for map in self.maps.values():
             map.finalize_tuning()
+        self.intern_prereqs()
 
         self.disambiguate_duplicate_locations()
         for loc in self.all_locations():
             self.locations_by_name[loc.name()] = loc
 
         self.finalize_ids(logic)
+        if LocationTable.available():
+            self.location_table = LocationTable(self.maps.values())
 
     def finalize_key_items(self):
         """
@@ -588,9 +628,11 @@ class DoomWad:
         replaces any item table entries for single-map versions of the same
         actual key with references to the newly created multikey item.
         """
+        keys_by_map = {}
         for key in self.keys_by_name.values():
             for mapname in key.maps:
                 self.maps[mapname].keyset.add(key)
+                keys_by_map.setdefault(mapname, set()).add(key)
 
             if key.fqin() in self.items_by_name:
                 continue
@@ -608,6 +650,18 @@ class DoomWad:
                 if keyname in self.items_by_name:
                     self.items_by_name[keyname] = key_item
 
+        self.keys_by_map = {
+            mapname: frozenset(keys) for mapname,keys in keys_by_map.items()
+        }
+        self.key_types_by_map = {}
+        for mapname,keys in self.keys_by_map.items():
+            types = {}
+            for key in keys:
+                types.setdefault(key.typename, set()).add(key)
+            self.key_types_by_map[mapname] = {
+                typename: frozenset(keys) for typename,keys in types.items()
+            }
+
     def weapon_capability(self, weapon, map=None):
         """
         Given a weapon typename, return the AP name of the item that grants the
@@ -0,0 +1,114 @@
+"""
+Columnar index of a wad's locations, for filtering them in bulk.
+
+Selecting locations for the pool, and counting them for stats and option
+defaults, mostly comes down to "which locations in these maps match this spawn
+filter and these categories". Doing that one DoomLocation at a time is slow for
+the larger wads, so if NumPy is installed, each wad also keeps its locations'
+filterable fields in parallel arrays and answers these queries with array
+operations instead. Without NumPy the wad falls back to filtering the location
+lists directly, with the same results.
+
+The table is built once the wad's logic and tuning are final, and isn't kept in
+sync with later changes to the locations.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from .categories import category_mask, query_mask
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class LocationTable:
+    # All the locations, grouped by map.
+    locations: List['DoomLocation']
+    # Map name -> (start, end) of that map's locations.
+    map_ranges: Dict[str,Tuple[int,int]]
+    # Distinct category sets; category_set indexes into this. Category bits
+    # aren't stable between processes, so we store the sets themselves and
+    # work out their masks at query time.
+    category_sets: List[frozenset]
+    # Columns, one entry per location.
+    spawn_filter: 'numpy.ndarray'
+    category_set: 'numpy.ndarray'
+    unreachable: 'numpy.ndarray'
+    enabled: 'numpy.ndarray'
+    enabled_with_secrets: 'numpy.ndarray'
+
+    @staticmethod
+    def available() -> bool:
+        return numpy is not None
+
+    def __init__(self, maps: Iterable['DoomMap']):
+        self.locations = []
+        self.map_ranges = {}
+        set_ids = {}
+        spawn_filter = []
+        category_set = []
+        for map in maps:
+            start = len(self.locations)
+            for loc in map.locations:
+                self.locations.append(loc)
+                spawn_filter.append(loc.spawn_filter)
+                category_set.append(set_ids.setdefault(loc.categories, len(set_ids)))
+            self.map_ranges[map.map] = (start, len(self.locations))
+
+        self.category_sets = list(set_ids)
+        self.spawn_filter = numpy.array(spawn_filter, dtype=numpy.int32)
+        self.category_set = numpy.array(category_set, dtype=numpy.int32)
+        self.unreachable = numpy.array([bool(loc.unreachable) for loc in self.locations], dtype=bool)
+        self.enabled = numpy.array([loc.is_default_enabled() for loc in self.locations], dtype=bool)
+        self.enabled_with_secrets = numpy.array([loc.is_default_enabled(True) for loc in self.locations], dtype=bool)
+
+    def mask(self, spawn_filter: int = 0, categories: Iterable[str] = (), default_enabled: bool = False, include_secrets: bool = False, reachable: bool = False) -> 'numpy.ndarray':
+        """
+        Returns a boolean array selecting the locations that match spawn_filter
+        (if nonzero), have at least one of the given categories (if any), are
+        enabled by default (if default_enabled is set), and aren't marked
+        unreachable (if reachable is set).
+        """
+        mask = numpy.ones(len(self.locations), dtype=bool)
+        if spawn_filter:
+            mask &= (self.spawn_filter & spawn_filter) != 0
+        if reachable:
+            mask &= ~self.unreachable
+        if categories:
+            query = query_mask(tuple(categories))
+            matches = numpy.array(
+                [bool(category_mask(categories) & query) for categories in self.category_sets],
+                dtype=bool)
+            mask &= matches[self.category_set]
+        if default_enabled:
+            mask &= self.enabled_with_secrets if include_secrets else self.enabled
+        return mask
+
+    def indices(self, mask: 'numpy.ndarray', maps: Iterable[str] | None = None) -> 'numpy.ndarray':
+        """
+        Returns the indices of the locations selected by mask, restricted to the
+        given maps (if any) and in the order the maps are given in.
+        """
+        if maps is None:
+            return numpy.flatnonzero(mask)
+        ranges = [self.map_ranges[map] for map in maps]
+        if not ranges:
+            return numpy.empty(0, dtype=numpy.intp)
+        return numpy.concatenate([
+            start + numpy.flatnonzero(mask[start:end])
+            for start,end in ranges
+        ])
+
+    def select(self, maps: Iterable[str] | None = None, **kwargs) -> List['DoomLocation']:
+        """
+        Returns the locations in the given maps (or all maps) matching the
+        filters in kwargs, as per mask().
+        """
+        locations = self.locations
+        return [locations[i] for i in self.indices(self.mask(**kwargs), maps).tolist()]
+
+    def count(self, map: str, **kwargs) -> int:
+        start,end = self.map_ranges[map]
+        return int(numpy.count_nonzero(self.mask(**kwargs)[start:end]))
@@ -0,0 +1,185 @@
+"""
+On-disk cache for loaded logic.
+
+Loading the logic for a wad from scratch takes long enough that we don't want
+to do it on every startup, so we pickle the results and reuse them as long as
+the inputs haven't changed.
+
+Cache entries are keyed by a digest of the *contents* of the inputs (logic and
+tuning files or logicpack sections), the core apworld version, and
+SCHEMA_VERSION, so rebuilding an apworld always invalidates its entries
+regardless of what its mtime is. Entries are written to a temporary file and
+renamed into place, so multiple generator processes on the same host can share
+the cache without ever seeing a partially written entry.
+"""
+
+import hashlib
+from importlib import resources
+import os
+import pickle
+import tempfile
+import time
+
+import Utils
+
+from .logicpack import LogicPackSection
+from .SpatialIndex import tuning_tolerance
+
+# Bump this whenever the model classes change in a way that makes previously
+# pickled instances unusable.
+SCHEMA_VERSION = 11
+
+# Temporary files older than this (in seconds) are assumed to have been left
+# behind by a process that died while writing them, and are removed on eviction.
+STALE_TMP_AGE = 5*60
+
+
+def core_version():
+    return resources.read_text('worlds.uzdoom', 'VERSION').strip()
+
+
+class LogicCache:
+    """
+    A directory of pickled logic, keyed by content digest.
+
+    Each entry belongs to a (wad, package, stage) triple; when a new entry is
+    stored, any other entries for the same triple are evicted, since they were
+    built from inputs that no longer exist.
+    """
+    hits: int = 0
+    misses: int = 0
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory or os.path.join(Utils.user_path(), "uzdoom", "cache")
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def digest(self, sources) -> str:
+        """
+        Compute the cache key for a list of logic/tuning sources. A logicpack
+        section is keyed on the contents of the whole pack it belongs to. The
+        tuning tolerance is included too, since it affects how tuning is applied.
+        """
+        h = hashlib.sha256()
+        h.update(f'{SCHEMA_VERSION}\0{core_version()}\0{tuning_tolerance()}\0'.encode('utf-8'))
+        packs = set()
+        for source in sources:
+            h.update(f'{source.name}\0'.encode('utf-8'))
+            if isinstance(source, LogicPackSection):
+                if id(source.pack) not in packs:
+                    packs.add(id(source.pack))
+                    h.update(source.pack.buf)
+            else:
+                h.update(source.read_bytes())
+        return h.hexdigest()
+
+    def prefix(self, name: str, package: str | None, stage: str) -> str:
+        return f'{name}.{package or "ext"}.{stage}.'
+
+    def path(self, name: str, package: str | None, stage: str, digest: str) -> str:
+        return os.path.join(self.directory, f'{self.prefix(name, package, stage)}{digest[:32]}.pickle')
+
+    def get(self, name: str, package: str | None, stage: str, digest: str):
+        """
+        Return the cached object for this key, or None if there isn't one.
+        Unreadable entries are reported, deleted, and treated as misses.
+        """
+        path = self.path(name, package, stage, digest)
+        try:
+            with open(path, 'rb') as fd:
+                (stored_digest, value) = pickle.load(fd)
+            if stored_digest != digest:
+                raise ValueError(f'digest mismatch (expected {digest}, got {stored_digest})')
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            print(f"Warning: discarding unreadable logic cache entry {path}: {e!r}")
+            self.remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def contains(self, name: str, package: str | None, stage: str, digest: str) -> bool:
+        return os.path.exists(self.path(name, package, stage, digest))
+
+    def put(self, name: str, package: str | None, stage: str, digest: str, value) -> None:
+        """
+        Store an object in the cache, atomically replacing any existing entry
+        for the same key, then evict stale entries for the same wad and stage.
+
+        Failing to write the entry isn't fatal, since we already have the value
+        in hand; it's reported and the value just doesn't get cached. (On
+        Windows, for example, the replace fails if another process has the
+        existing entry open.)
+        """
+        path = self.path(name, package, stage, digest)
+        tmp_path = None
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as tmp:
+                pickle.dump((digest, value), tmp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: couldn't write logic cache entry {path}: {e!r}")
+            if tmp_path:
+                self.remove(tmp_path)
+            return
+        except BaseException:
+            if tmp_path:
+                self.remove(tmp_path)
+            raise
+        self.evict(name, package, stage, keep=path)
+
+    def evict(self, name: str, package: str | None, stage: str, keep: str) -> None:
+        """
+        Remove all entries for this wad and stage other than keep, along with
+        any temporary files for them left behind by processes that died before
+        finishing writing.
+        """
+        prefix = self.prefix(name, package, stage)
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+        now = time.time()
+        for entry in entries:
+            if not entry.startswith(prefix):
+                continue
+            path = os.path.join(self.directory, entry)
+            if entry.endswith('.pickle'):
+                if path != keep:
+                    self.remove(path)
+            elif entry.endswith('.tmp'):
+                # Recent ones may belong to another process that's still writing.
+                try:
+                    if now - os.path.getmtime(path) > STALE_TMP_AGE:
+                        self.remove(path)
+                except OSError:
+                    pass
+        # Also clean up after older versions, which didn't key entries by digest.
+        self.remove(os.path.join(self.directory, f'{name}.{package or "ext"}.pickle'))
+
+    def remove(self, path: str) -> None:
+        # Another process may have removed it first, or (on Windows) may still
+        # have it open; either way it's not our problem any more.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def report(self) -> None:
+        if "GZAP_DEBUG" not in os.environ:
+            return
+        print(f"Logic cache: {self.hits} hits, {self.misses} misses ({self.directory})")
+
+
+_CACHE = None
+def logic_cache() -> LogicCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = LogicCache()
+    return _CACHE
@@ -0,0 +1,80 @@
+"""
+Spatial index used to match tuning records to nearby locations.
+
+Tuning records identify locations by position. If a rescan moves an item
+slightly -- because the map was edited, say, or the item now spawns a unit
+higher -- the old tuning no longer lines up exactly with any location, and
+without some help it would be silently dropped, leaving the location with
+pessimistic default logic. This index lets us find the closest location to
+where the tuning says it should be instead, as long as it's close enough.
+
+How close is "close enough" can be set with GZAP_TUNING_TOLERANCE, in map
+units; setting it to 0 disables fuzzy matching entirely.
+"""
+
+import functools
+import math
+import os
+from typing import Dict, List, Tuple
+
+from .DoomPosition import DoomCoordPosition
+
+DEFAULT_TOLERANCE = 2.0
+
+def tuning_tolerance() -> float:
+    return parse_tolerance(os.environ.get('GZAP_TUNING_TOLERANCE'))
+
+@functools.lru_cache
+def parse_tolerance(value: str | None) -> float:
+    # Cached so that a bad value is only complained about once, rather than
+    # once per wad.
+    if not value:
+        return DEFAULT_TOLERANCE
+    try:
+        tolerance = float(value)
+    except ValueError:
+        tolerance = None
+    if tolerance is None or not math.isfinite(tolerance) or tolerance < 0:
+        print(f"Warning: GZAP_TUNING_TOLERANCE should be a distance in map units (or 0 to disable), not '{value}'; using {DEFAULT_TOLERANCE}")
+        return DEFAULT_TOLERANCE
+    return tolerance
+
+
+class SpatialIndex:
+    """
+    Grid hash of locations with coordinate positions, keyed on map and grid cell.
+    """
+    cell_size: float
+    cells: Dict[Tuple[str,int,int,int],List['DoomLocation']]
+
+    def __init__(self, locations, cell_size: float):
+        self.cell_size = max(cell_size, 1.0)
+        self.cells = {}
+        for loc in locations:
+            if type(loc.pos) is DoomCoordPosition:
+                self.cells.setdefault(self.cell(loc.pos), []).append(loc)
+
+    def cell(self, pos: DoomCoordPosition) -> Tuple[str,int,int,int]:
+        return (
+            pos.map,
+            math.floor(pos.x / self.cell_size),
+            math.floor(pos.y / self.cell_size),
+            math.floor(pos.z / self.cell_size))
+
+    def nearby(self, pos: DoomCoordPosition, radius: float) -> List[Tuple[float,'DoomLocation']]:
+        """
+        Returns (distance, location) for every location within radius of pos,
+        closest first.
+        """
+        (map, cx, cy, cz) = self.cell(pos)
+        r = math.ceil(radius / self.cell_size)
+        found = []
+        for x in range(cx-r, cx+r+1):
+            for y in range(cy-r, cy+r+1):
+                for z in range(cz-r, cz+r+1):
+                    for loc in self.cells.get((map, x, y, z), []):
+                        distance = math.dist((pos.x, pos.y, pos.z), (loc.pos.x, loc.pos.y, loc.pos.z))
+                        if distance <= radius:
+                            found.append((distance, loc))
+        found.sort(key=lambda hit: (hit[0], hit[1].pos))
+        return found
@@ -1,10 +1,12 @@
 from collections import Counter
-from importlib import resources
-import json, os, pickle, re
-
-import Utils
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
 
 from .DoomLogic import *
+from .LogicCache import logic_cache
+from .logicpack import LogicPackSection, parse_text_batch, read_records
+from .records import decode_record, to_record
 
 class WadDataLoader:
     logic: DoomLogic
@@ -15,45 +17,37 @@ class WadDataLoader:
 
     def load_records(self, file):
         # print(f"Loading logic for {self.wad.name} from {file}")
-        buf = ''
-        for idx,line in enumerate(file.read_text().splitlines()):
-            if not line.startswith("AP-") and not buf:
-                continue
-
-            if not line.endswith('}'):
-                buf += line +  '\n'
-                continue
-
-            line = buf + line
-            buf = ''
+        self.apply_records(file, read_records(file, decode_record))
 
+    def apply_records(self, file, records):
+        for evt, payload, line_no in records:
             try:
-                [evt, payload] = line.split(" ", 1)
-                payload = json.loads(payload)
-
+                # Text records arrive already decoded into record objects, but
+                # logicpack records are plain JSON and need converting.
+                record = to_record(evt, payload)
                 if evt == "AP-SCAN":
-                    self.wad.set_flags(payload['flags'])
+                    self.wad.set_flags(record.flags)
                 elif evt == "AP-MAP":
-                    self.wad.new_map(payload)
+                    self.wad.new_map(record)
                 elif evt == "AP-ITEM":
-                    self.wad.new_item(payload)
+                    self.wad.new_item(record)
                 elif evt == "AP-SCAN-DONE":
                     # self.wad.finalize_scan(payload)
                     pass
                 elif evt == "AP-REGION":
-                    self.wad.define_region(**payload)
+                    self.wad.define_region(record.map, record.keys, record.region)
                 elif evt == "AP-CHECK":
-                    self.wad.tune_location(**payload)
+                    self.wad.tune_location(record.id, record.name, record.pos, record.keys, record.region, record.unreachable)
                 elif evt == "AP-SECRET":
-                    self.wad.new_secret(payload)
+                    self.wad.new_secret(record)
                 elif evt == "AP-KEY":
-                    self.wad.new_key(**payload)
+                    self.wad.new_key(record.tag, record.typename, record.scopename, record.cluster, record.maps)
                 else:
                     # AP-XON, AP-ACK, AP-STATUS, AP-CHAT, and other multiplayer-only messages
                     pass
 
             except Exception as e:
-                raise ValueError(f"Error loading logic/tuning for {self.wad.name} on line {idx} of {file}:\n{line}") from e
+                raise ValueError(f"Error loading logic/tuning for {self.wad.name} on line {line_no} of {file}:\n{evt} {payload}") from e
 
     def print_support_table(self) -> None:
         pool = self.wad.stats_pool(3) # UV difficulty
@@ -95,63 +89,30 @@ class WadLogicLoader(WadDataLoader):
     def __init__(self, logic: DoomLogic, name: str, package: str):
         self.logic = logic
         self.wad = DoomWad(name, package)
-        os.makedirs(os.path.join(Utils.user_path(), "uzdoom/cache"), exist_ok=True)
 
     def __exit__(self, err_type, err_value, err_stack):
         if err_type is not None:
             return False
 
-        self.save_cache()
         self.wad.finalize_logic(self.logic)
         self.print_stats()
         self.logic.add_wad(self.wad.name, self.wad)
         return True
 
     def load_logic(self, files):
-        if self.logic_cache_valid():
-            try:
-                self.wad = self.load_cache()
-                return
-            except:
-                pass
+        """
+        Load the logic from the given files, or from the cache if we've loaded
+        these exact files before.
+        """
+        cache = logic_cache()
+        digest = cache.digest(files)
+        wad = cache.get(self.wad.name, self.wad.package, 'logic', digest)
+        if wad is not None:
+            self.wad = wad
+            return
         for file in files:
             self.load_records(file)
-        self.save_cache()
-
-    def cache_path(self):
-        gzd_dir = os.path.join(Utils.user_path(), "uzdoom")
-        suffix = "ext" if self.wad.package is None else self.wad.package.replace('worlds.', '')
-        return f'{gzd_dir}/cache/{self.wad.name}.{self.wad.package or "ext"}.pickle'
-
-    def package_timestamp(self, package):
-        apworld_path = re.sub(r'\.apworld.*', '.apworld', str(resources.files(package)))
-        return os.path.getmtime(apworld_path)
-
-    def logic_cache_valid(self):
-        '''
-        A logic cache is valid iff:
-        - the cache file exists, and
-        - the cache file is newer than uzdoom.apworld, and
-        - the cache file is newer than the wad-specific apworld.
-        '''
-        if not os.path.exists(self.cache_path()):
-            return False
-
-        # If the core apworld is more recent, use that ts instead, since it may
-        # have changed the internal definition of the DoomWad class.
-        ts = max(self.package_timestamp(self.wad.package), self.package_timestamp('worlds.uzdoom'))
-
-        return os.path.getmtime(self.cache_path()) > ts
-
-    def load_cache(self):
-        with open(self.cache_path(), 'rb') as fd:
-            # print(f'Leading cached logic from {self.cache_path()}')
-            return pickle.load(fd)
-
-    def save_cache(self):
-        with open(self.cache_path(), 'wb') as fd:
-            # print(f'Saving cached logic to {self.cache_path()}')
-            pickle.dump(self.wad, fd)
+        cache.put(self.wad.name, self.wad.package, 'logic', digest, self.wad)
 
 class WadTuningLoader(WadDataLoader):
     def __init__(self, logic: DoomLogic):
@@ -162,6 +123,32 @@ class WadTuningLoader(WadDataLoader):
         return err_type is None
 
     def load_tuning(self, files):
-        for file in files:
-            self.load_records(file)
+        if self.parse_in_parallel(files):
+            # Parse all the files at once, then apply them in the same order we
+            # would have loaded them in, so that later files still override
+            # earlier ones.
+            texts = [file.read_text(encoding='utf-8') for file in files]
+            with ProcessPoolExecutor(max_workers=self.max_workers(len(files))) as pool:
+                batches = pool.map(
+                    parse_text_batch, [str(file) for file in files], texts,
+                    [decode_record] * len(files))
+                for file,batch in zip(files, batches):
+                    self.apply_records(file, batch)
+        else:
+            for file in files:
+                self.load_records(file)
         self.wad.finalize_tuning(self.logic)
+
+    def parse_in_parallel(self, files) -> bool:
+        # Only worth it for multiple text files, and only if the user asked for
+        # it. Don't try to start a pool from inside a worker of another pool,
+        # e.g. if we're being called from preload_wads.
+        return (
+            "GZAP_PARALLEL_LOAD" in os.environ
+            and multiprocessing.parent_process() is None
+            and len(files) > 1
+            and not any(isinstance(file, LogicPackSection) for file in files))
+
+    def max_workers(self, nrof_files: int) -> int:
+        workers = os.environ.get("GZAP_PARALLEL_LOAD", "")
+        return min(nrof_files, int(workers) if workers.isdigit() else os.cpu_count() or 1)
@@ -0,0 +1,68 @@
+"""
+A summary of a wad's logic, containing just what's needed at apworld import time.
+
+Archipelago needs the datapack (item and location IDs and groups) and the
+options for every installed world as soon as the apworld is imported, long
+before it knows which of them will actually be used. Building the full DoomWad
+for every installed wad just to list them is expensive, so instead each wad
+apworld is imported using a manifest, which is computed from the full logic
+the first time it's loaded and cached thereafter. The full logic is only loaded
+when a world for that wad is actually created.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set
+
+from .categories import CategoryGroups
+from .DoomLogic import DoomLogic
+
+
+@dataclass
+class WadManifest:
+    name: str
+    package: str | None
+    # Flags passed through from the logic file
+    flags: Dict[str,Any] = field(default_factory=dict)
+    # Datapack contents
+    item_name_to_id: Dict[str,int] = field(default_factory=dict)
+    item_name_groups: CategoryGroups = field(default_factory=CategoryGroups)
+    location_name_to_id: Dict[str,int] = field(default_factory=dict)
+    location_name_groups: CategoryGroups = field(default_factory=CategoryGroups)
+    # Information used to generate option defaults and docstrings
+    map_names: List[str] = field(default_factory=list)
+    default_starting_maps: List[str] = field(default_factory=list)
+    default_solo_starting_maps: List[str] | None = None
+    winnable_map_names: List[str] = field(default_factory=list)
+    boss_map_names: List[str] = field(default_factory=list)
+    global_weapons: Set[str] = field(default_factory=set)
+    local_weapons: Set[str] = field(default_factory=set)
+    has_tuning: bool = False
+    has_combat_logic_hints: bool = False
+
+    @staticmethod
+    def from_logic(logic: DoomLogic, has_tuning: bool) -> 'WadManifest':
+        wad = logic.wad
+        weapons = [item for item in wad.items() if item.has_category('weapon')]
+        return WadManifest(
+            name=wad.name,
+            package=wad.package,
+            flags=dict(wad.flags),
+            item_name_to_id=logic.item_names_to_ids.copy(),
+            item_name_groups=logic.item_categories_to_names.copy(),
+            location_name_to_id=logic.location_names_to_ids.copy(),
+            location_name_groups=logic.location_categories_to_names.copy(),
+            map_names=list(wad.maps.keys()),
+            default_starting_maps=[map.map for map in wad.default_starting_maps()],
+            default_solo_starting_maps=wad.default_solo_starting_maps(),
+            winnable_map_names=list(wad.all_winnable_map_names()),
+            boss_map_names=list(wad.all_boss_map_names()),
+            global_weapons={item.name() for item in weapons if not item.map},
+            local_weapons={item.name() for item in weapons if item.map},
+            has_tuning=has_tuning,
+            has_combat_logic_hints=wad.has_combat_logic_hints())
+
+    def get_flag(self, flag):
+        return self.flags.get(flag, False)
+
+    def use_hub_logic(self):
+        return self.get_flag('use_hub_logic')
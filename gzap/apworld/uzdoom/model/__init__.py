@@ -6,6 +6,7 @@ locations, what items they originally contained, what to populate the item pool
 with, what keys are needed to access what locations, etc.
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from importlib import resources
 import os
 from pathlib import Path
@@ -13,20 +14,24 @@ import re
 
 import Utils
 
+from .categories import CategoryGroups, NamesAndGroups
 from .DoomItem import *
 from .DoomLocation import *
 from .DoomMap import *
 from .DoomWad import *
 from .DoomLogic import *
 from .WadLogicLoader import *
+from .WadManifest import *
+from .LogicCache import logic_cache
+from .logicpack import LOGICPACK_NAME, LogicPack
 
 
-def get_tuned_wad(logic: DoomLogic) -> DoomWad:
+def get_tuned_wad(logic: DoomLogic, files = None) -> DoomWad:
     if logic.wad.tuned:
         return logic.wad
     with WadTuningLoader(logic) as wadloader:
         logic.wad.tuned = True
-        wadloader.load_tuning(tuning_files(logic.wad.package, logic.wad.name))
+        wadloader.load_tuning(files if files is not None else wad_sources(logic.wad.package)[2])
     return logic.wad
 
 def logic_files(package):
@@ -77,6 +82,20 @@ def tuning_files(package, wad):
         if package or (p.is_file() and (p.name == wad or p.name.startswith(f"{wad}.")))
     ], key=lambda f: f.name)
 
+def find_logicpack(package):
+    '''
+    Returns the precompiled logicpack for the given package, if it has one, or
+    None otherwise. Logicpacks are generated at build time and replace the logic
+    and tuning files in the apworld; they hold the same records, but in a form
+    that doesn't need to go through the JSON decoder when the cache is cold.
+    '''
+    if not package:
+        return None
+    path = resources.files(package).joinpath(LOGICPACK_NAME)
+    if not path.is_file():
+        return None
+    return LogicPack(path)
+
 def init_wad(logic, package, logic_files):
     wadname = logic_files[0].name.split(".")[0]
     with WadLogicLoader(logic, wadname, package) as wadloader:
@@ -87,6 +106,22 @@ def print_header(package):
         return
     print('%32s \x1B[4m[ logic from %s ]\x1B[0m' % ('', package))
 
+def wad_sources(package):
+    '''
+    Returns (wadname, logic, tuning) for the given package, where logic and
+    tuning are lists of sources to load the logic and tuning from. These are
+    the logicpack sections if the package has a logicpack, and the individual
+    logic and tuning files otherwise. An empty tuning list means that there is
+    no tuning data for the wad.
+    '''
+    pack = find_logicpack(package)
+    if pack:
+        return (pack.wad_name, [pack.logic], [pack.tuning] if pack.ntuning else [])
+    files = logic_files(package)
+    assert len(files) > 0, f'Package {package} contains no logic files'
+    wadname = files[0].name.split(".")[0]
+    return (wadname, files, tuning_files(package, wadname))
+
 _LOGIC = {}
 def init_wads(package):
     global _LOGIC
@@ -100,16 +135,77 @@ def init_wads(package):
     else:
         print_header(package)
 
-    logic = DoomLogic()
-
-    files = logic_files(package)
-    assert len(files) > 0, f'Package {package} contains no logic files'
-    init_wad(logic, package, files)
-    get_tuned_wad(logic)
+    (wadname, files, tuning) = wad_sources(package)
+
+    # Try to load the fully tuned logic from the cache first. If that fails,
+    # init_wad will try the cache for the untuned logic, which saves us some
+    # time when only the tuning has changed.
+    cache = logic_cache()
+    digest = cache.digest(files + tuning)
+    logic = cache.get(wadname, package, 'tuned', digest)
+    if logic is None:
+        logic = DoomLogic()
+        init_wad(logic, package, files)
+        get_tuned_wad(logic, tuning)
+        cache.put(wadname, package, 'tuned', digest, logic)
+    cache.report()
 
     _LOGIC[package] = logic
     return logic
 
+def preload_wads(packages, max_workers=None):
+    '''
+    Load the logic for several packages at once, in parallel, so that later
+    calls to init_wads for any of them return immediately.
+
+    Packages whose tuned logic is already in the cache are loaded in-process,
+    since unpickling them is faster than starting a worker. The rest are loaded
+    in a process pool, one package per worker; each worker also stores what it
+    loaded in the cache, as init_wads would.
+    '''
+    global _LOGIC
+    pending = [package for package in dict.fromkeys(packages) if package not in _LOGIC]
+    cache = logic_cache()
+    uncached = []
+    for package in pending:
+        (wadname, files, tuning) = wad_sources(package)
+        if not cache.contains(wadname, package, 'tuned', cache.digest(files + tuning)):
+            uncached.append(package)
+
+    if len(uncached) > 1:
+        workers = min(len(uncached), max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for package,logic in zip(uncached, pool.map(init_wads, uncached)):
+                _LOGIC[package] = logic
+
+    for package in pending:
+        init_wads(package)
+
+_MANIFESTS = {}
+def init_manifest(package) -> WadManifest:
+    '''
+    Returns the manifest for the given package, i.e. the subset of the logic
+    needed to register the apworld and build its options.
+
+    This is much cheaper than init_wads as long as the manifest is in the cache.
+    If it isn't, we need to load the full logic to build it, but once that's
+    done it's cached (along with the full logic) for next time.
+    '''
+    global _MANIFESTS
+    if package in _MANIFESTS:
+        return _MANIFESTS[package]
+
+    (wadname, files, tuning) = wad_sources(package)
+    cache = logic_cache()
+    digest = cache.digest(files + tuning)
+    manifest = cache.get(wadname, package, 'manifest', digest)
+    if manifest is None:
+        manifest = WadManifest.from_logic(init_wads(package), bool(tuning))
+        cache.put(wadname, package, 'manifest', digest, manifest)
+
+    _MANIFESTS[package] = manifest
+    return manifest
+
 def all_map_names(logic) -> Set[str]:
     return {map.map for map in logic.wad.all_maps()}
 
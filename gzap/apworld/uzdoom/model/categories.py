@@ -0,0 +1,211 @@
+'''
+Bitmask representation of item and location categories.
+
+Categories are strings like 'key' or 'ap_progression', and every item and
+location has a set of them. Checking them is one of the most common things we
+do, so each category is assigned a bit, and each item and location keeps a
+bitmask of its categories alongside the set, making has_category() a single
+integer and.
+
+The bit assignments are process-wide and depend on the order categories are
+first seen in, so masks are never pickled; they're recomputed from the
+category strings on first use after loading.
+'''
+
+from collections.abc import Mapping, Set
+from typing import Collection, Dict, FrozenSet, Iterable, Tuple
+
+_BITS: Dict[str,int] = {}
+_QUERY_MASKS: Dict[Tuple[str,...],int] = {}
+_SETS: Dict[FrozenSet[str],FrozenSet[str]] = {}
+
+def category_bit(category: str) -> int:
+    bit = _BITS.get(category)
+    if bit is None:
+        bit = _BITS[category] = 1 << len(_BITS)
+    return bit
+
+def category_mask(categories: Iterable[str]) -> int:
+    mask = 0
+    for category in categories:
+        mask |= category_bit(category)
+    return mask
+
+def intern_categories(categories: FrozenSet[str]) -> FrozenSet[str]:
+    '''
+    Returns a shared copy of the given category set. There are only a few dozen
+    distinct sets in any given wad, so this saves having a separate one for
+    every item and location.
+    '''
+    return _SETS.setdefault(categories, categories)
+
+def slot_names(cls) -> Tuple[str,...]:
+    '''
+    All the __slots__ declared by cls and its superclasses.
+    '''
+    names = cls.__dict__.get('_slot_names')
+    if names is None:
+        names = tuple(
+            name
+            for klass in reversed(cls.__mro__)
+            for name in klass.__dict__.get('__slots__', ())
+        )
+        cls._slot_names = names
+    return names
+
+def query_mask(categories: Tuple[str,...]) -> int:
+    '''
+    Like category_mask, but memoized, for the small fixed sets of categories
+    passed to has_category().
+    '''
+    mask = _QUERY_MASKS.get(categories)
+    if mask is None:
+        mask = _QUERY_MASKS[categories] = category_mask(categories)
+    return mask
+
+
+class Categorized:
+    '''
+    Mixin for things with categories (items and locations).
+
+    Setting categories discards the cached mask, along with anything else that
+    subclasses derive from the categories.
+
+    Subclasses use __slots__ and must declare _categories and _category_mask
+    in them; this class declares none of its own so that it can be mixed in
+    alongside other slotted classes.
+    '''
+    __slots__ = ()
+    _categories: FrozenSet[str]
+    _category_mask: int | None
+    # Volatile state that shouldn't be pickled.
+    UNPICKLED = ('_category_mask',)
+
+    @property
+    def categories(self) -> FrozenSet[str]:
+        return self._categories
+
+    @categories.setter
+    def categories(self, categories: FrozenSet[str]) -> None:
+        self._categories = intern_categories(categories)
+        self.categories_changed()
+
+    def categories_changed(self) -> None:
+        self._category_mask = None
+
+    def category_mask(self) -> int:
+        if self._category_mask is None:
+            self._category_mask = category_mask(self._categories)
+        return self._category_mask
+
+    def has_category(self, *args) -> int:
+        # This is called a lot, so avoid function calls on the fast path.
+        mask = self._category_mask
+        if mask is None:
+            mask = self.category_mask()
+        query = _QUERY_MASKS.get(args)
+        if query is None:
+            query = query_mask(args)
+        return mask & query
+
+    def __getstate__(self):
+        return {
+            attr: getattr(self, attr)
+            for attr in slot_names(type(self))
+            if attr not in self.UNPICKLED and hasattr(self, attr)
+        }
+
+    def __setstate__(self, state):
+        for attr in self.UNPICKLED:
+            setattr(self, attr, None)
+        for attr,value in state.items():
+            setattr(self, attr, value)
+        self._categories = intern_categories(self._categories)
+
+
+class CategoryGroups(Mapping):
+    '''
+    Item or location names grouped by category, for use as AP name groups.
+
+    Every combination of categories is a valid group name (e.g. 'big-secret'
+    for things that are both big and secret), but materializing all of them
+    would need 2^n-1 groups for something with n categories. Instead we store
+    one group per category, and resolve composite names on demand by
+    intersecting the groups for their parts. The categories in a composite name
+    can be given in any order.
+
+    Only the single-category groups (and any other groups the mapping was
+    created with) are iterated over, so only those go into the datapack;
+    composite groups can be looked up, but aren't listed.
+    '''
+    # Upper bound on the number of resolved composite groups we keep around.
+    MAX_COMPOSITES = 256
+
+    groups: Dict[str,Collection[str]]
+    composites: Dict[str,FrozenSet[str]]
+
+    def __init__(self, groups: Dict[str,Collection[str]] | None = None):
+        self.groups = dict(groups or {})
+        self.composites = {}
+
+    def add(self, name: str, categories: Iterable[str]) -> None:
+        for category in categories:
+            self.groups.setdefault(category, set()).add(name)
+        self.composites.clear()
+
+    def composite(self, group: str) -> FrozenSet[str]:
+        parts = set(group.split('-'))
+        if len(parts) < 2 or not parts <= self.groups.keys():
+            raise KeyError(group)
+        first,*rest = sorted((self.groups[part] for part in parts), key=len)
+        names = frozenset(first).intersection(*rest)
+        if not names:
+            raise KeyError(group)
+        if len(self.composites) < self.MAX_COMPOSITES:
+            self.composites[group] = names
+        return names
+
+    def __getitem__(self, group: str) -> Collection[str]:
+        names = self.groups.get(group)
+        if names is None:
+            names = self.composites.get(group)
+        if names is None:
+            names = self.composite(group)
+        return names
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def copy(self) -> 'CategoryGroups':
+        return CategoryGroups(self.groups)
+
+
+class NamesAndGroups(Set):
+    '''
+    All item (or location) names plus all group names, including composite
+    groups, for AP's checks that something names either an item or a group.
+    Like CategoryGroups, only the names and the listed groups are iterated over.
+    '''
+    names: Collection[str]
+    groups: CategoryGroups
+
+    def __init__(self, names: Collection[str], groups: CategoryGroups):
+        self.names = names
+        self.groups = groups
+
+    @classmethod
+    def _from_iterable(cls, names: Iterable[str]) -> FrozenSet[str]:
+        return frozenset(names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names or name in self.groups
+
+    def __iter__(self):
+        yield from self.names
+        yield from (group for group in self.groups if group not in self.names)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -0,0 +1,453 @@
+'''
+Reading logic and tuning records, in both text and precompiled form.
+
+The scanner and the client emit logic and tuning data as a text stream of
+`AP-FOO {json}` records. That's great for humans and for version control but
+slow to load, since every record has to go through the JSON decoder every time
+the logic cache is cold.
+
+So at apworld build time we compile the logic and tuning for each wad into a
+"logicpack", which ships in the apworld in place of the text files. It's a
+compact binary encoding of the same record stream consisting of:
+- a header;
+- an interned string table (offsets + utf-8 blob);
+- a table of fixed-width rows, one per record;
+- an "aux" table of u32s holding variable-length data (keysets, non-coordinate
+  positions) referenced from the rows.
+
+AP-ITEM records (the overwhelming majority of logic) and AP-CHECK records (the
+overwhelming majority of tuning) get dedicated row layouts. Tuning is also
+condensed at build time: all AP-CHECK records for a given position are merged
+into a single row with the keysets already minimized. Everything else is stored
+as a "generic" row holding the event name and its JSON payload verbatim.
+
+Reading a logicpack produces exactly the same (event, payload, record_no) tuples
+as reading the original files, so the rest of the loader doesn't need to care
+which one it's looking at.
+
+This file is also run as a script by the Makefile to build logicpacks, and thus
+needs to be importable without the rest of the apworld (or Archipelago).
+'''
+
+import io
+import json
+import mmap
+import struct
+import sys
+from pathlib import Path
+
+LOGICPACK_NAME = 'wad.logicpack'
+
+MAGIC = b'GZLP'
+VERSION = 1
+# magic, version, reserved, nrof strings, size of string blob, nrof logic rows,
+# nrof tuning rows, nrof aux words
+HEADER = struct.Struct('<4sHHIIIII')
+# kind, flags, filter, s0, s1, s2, s3 (map), s4, x, y, z
+ROW = struct.Struct('<BBHIIIIIiii')
+NONE = 0xFFFFFFFF
+
+# Row kinds
+GENERIC = 0   # s0=event, s1=payload as JSON
+ITEM = 1      # s0=category, s1=typename, s2=tag, s3=map, s4=tid
+CHECK = 2     # s0=name, s1=region, s2=keysets (aux), s3=map, s4=id
+
+# Row flags
+POS_AUX = 0x01          # pos is stored as atoms in aux[x] rather than x,y,z
+ITEM_SECRET = 0x02
+ITEM_FILTER = 0x04      # filter column holds the spawn filter
+ITEM_SKILL = 0x08       # filter column holds a bitmask of skill levels
+ITEM_TID = 0x10
+CHECK_UNREACHABLE_SET = 0x02
+CHECK_UNREACHABLE = 0x04
+CHECK_ID = 0x08
+
+# Tags for position atoms stored in aux
+ATOM_INT = 0
+ATOM_STR = 1
+ATOM_JSON = 2
+
+ITEM_FIELDS = frozenset({'category', 'typename', 'tag', 'pos', 'filter', 'skill', 'secret', 'tid'})
+
+
+def read_text_records(file, decode=None):
+    """
+    Read AP-* records from a logic or tuning file.
+
+    This is a generator that yields (event, payload, line_no) tuples, where
+    event is the record type (e.g. "AP-ITEM"), payload is the decoded JSON, and
+    line_no is the (1-based) line on which the record starts. The file is read
+    incrementally rather than being loaded into memory all at once, so this
+    works equally well on files on disk and on files inside a zipped apworld.
+
+    Records may span multiple lines; a record is considered complete once we
+    see a line ending in '}'. Lines outside a record that don't start with
+    "AP-" are ignored.
+
+    If decode is given, it's called with (event, text) to decode the payload
+    instead of using json.loads.
+    """
+    with file.open('r', encoding='utf-8') as fd:
+        yield from parse_text_records(fd, file, decode)
+
+
+def parse_text_records(lines, file, decode=None):
+    """
+    Parse AP-* records from an iterable of lines, which came from the given
+    file; see read_text_records.
+    """
+    buf = []
+    start = 0
+    for line_no,line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if not buf:
+            if not line.startswith("AP-"):
+                continue
+            start = line_no
+
+        if not line.endswith('}'):
+            buf.append(line)
+            continue
+
+        if buf:
+            buf.append(line)
+            line = '\n'.join(buf)
+            buf = []
+
+        try:
+            [evt, payload] = line.split(" ", 1)
+            yield (evt, decode(evt, payload) if decode else json.loads(payload), start)
+        except ValueError as e:
+            raise ValueError(f"Error decoding record on line {start} of {file}:\n{line}") from e
+
+
+def parse_text_batch(file, text, decode=None):
+    """
+    Parse all the records in the already-read contents of a text file and
+    return them as a list. This is what tuning loader worker processes run.
+    """
+    return list(parse_text_records(io.StringIO(text), file, decode))
+
+
+def read_records(file, decode=None):
+    """
+    Read AP-* records from a logic or tuning source, which may be either a
+    text file or one section of a logicpack. See read_text_records for details.
+    Logicpack records are always yielded as plain JSON; decode is only used for
+    text files.
+    """
+    if isinstance(file, LogicPackSection):
+        return file.records()
+    return read_text_records(file, decode)
+
+
+def minimize_keysets(keysets):
+    """
+    Reduce an or-of-ands of keysets to its minimal form, i.e. drop every keyset
+    that is a proper superset of some other keyset. This produces the same result
+    as DoomReachable.finalize_tuning.
+    """
+    keysets = set(keysets)
+    return [ks for ks in keysets if not any(other < ks for other in keysets)]
+
+
+class LogicPackSection:
+    """
+    One section (logic or tuning) of a loaded logicpack. Quacks enough like a
+    file that the loader can use it in place of one.
+    """
+    def __init__(self, pack, name, first, last):
+        self.pack = pack
+        self.name = name
+        self.first = first
+        self.last = last
+
+    def __str__(self):
+        return f'{self.pack.path}:{self.name}'
+
+    def records(self):
+        return self.pack.records(self.first, self.last)
+
+
+class LogicPack:
+    """
+    A logicpack loaded into memory.
+
+    If the pack is a file on disk it is mmapped; if it's inside a zipped apworld
+    it is read in a single call. In both cases the string table and rows are
+    decoded on demand directly from the underlying buffer.
+    """
+    def __init__(self, path):
+        self.path = path
+        if isinstance(path, Path):
+            with path.open('rb') as fd:
+                self.buf = memoryview(mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            self.buf = memoryview(path.read_bytes())
+
+        (magic, version, _, nstrings, strsize, self.nlogic, self.ntuning, naux) = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} logicpack')
+
+        offset = HEADER.size
+        self.string_offsets = self.buf[offset:offset + 4*(nstrings+1)].cast('I')
+        offset += 4*(nstrings+1)
+        self.string_blob = self.buf[offset:offset + strsize]
+        offset += (strsize + 3) & ~3
+        self.rows_offset = offset
+        offset += ROW.size * (self.nlogic + self.ntuning)
+        self.aux = self.buf[offset:offset + 4*naux].cast('I')
+        self.strings = [None] * nstrings
+
+        # String 0 is always the wad name.
+        self.wad_name = self.string(0)
+        self.logic = LogicPackSection(self, f'{self.wad_name}.logic', 0, self.nlogic)
+        self.tuning = LogicPackSection(self, f'{self.wad_name}.tuning', self.nlogic, self.nlogic + self.ntuning)
+
+    def string(self, idx):
+        if idx == NONE:
+            return None
+        s = self.strings[idx]
+        if s is None:
+            s = self.strings[idx] = str(self.string_blob[self.string_offsets[idx]:self.string_offsets[idx+1]], 'utf-8')
+        return s
+
+    def int(self, word):
+        return word - 0x100000000 if word & 0x80000000 else word
+
+    def pos(self, flags, map, x, y, z):
+        if not flags & POS_AUX:
+            return [self.string(map), x, y, z]
+        pos = [self.string(map)]
+        n = self.aux[x]
+        for i in range(x+1, x+1+2*n, 2):
+            tag, value = self.aux[i], self.aux[i+1]
+            if tag == ATOM_INT:
+                pos.append(self.int(value))
+            elif tag == ATOM_STR:
+                pos.append(self.string(value))
+            else:
+                pos.append(json.loads(self.string(value)))
+        return pos
+
+    def keysets(self, idx):
+        if idx == NONE:
+            return [None]
+        keysets = []
+        n = self.aux[idx]
+        idx += 1
+        for _ in range(n):
+            size = self.aux[idx]
+            keysets.append([self.string(s) for s in self.aux[idx+1:idx+1+size]])
+            idx += 1 + size
+        return keysets
+
+    def records(self, first, last):
+        for row in range(first, last):
+            (kind, flags, filter, s0, s1, s2, s3, s4, x, y, z) = ROW.unpack_from(self.buf, self.rows_offset + row*ROW.size)
+            if kind == ITEM:
+                payload = {
+                    'category': self.string(s0),
+                    'typename': self.string(s1),
+                    'tag': self.string(s2),
+                    'pos': self.pos(flags, s3, x, y, z),
+                }
+                if flags & ITEM_FILTER:
+                    payload['filter'] = filter
+                if flags & ITEM_SKILL:
+                    payload['skill'] = [skill for skill in range(16) if filter & (1 << skill)]
+                if flags & ITEM_SECRET:
+                    payload['secret'] = True
+                if flags & ITEM_TID:
+                    payload['tid'] = s4
+                yield ('AP-ITEM', payload, row+1)
+            elif kind == CHECK:
+                # A condensed tuning record that may expand into multiple
+                # AP-CHECKs, one per keyset.
+                pos = self.pos(flags, s3, x, y, z)
+                unreachable = bool(flags & CHECK_UNREACHABLE) if flags & CHECK_UNREACHABLE_SET else None
+                for keys in self.keysets(s2):
+                    yield ('AP-CHECK', {
+                        'id': s4 if flags & CHECK_ID else None,
+                        'name': self.string(s0),
+                        'pos': pos,
+                        'keys': keys,
+                        'region': self.string(s1),
+                        'unreachable': unreachable,
+                    }, row+1)
+            else:
+                yield (self.string(s0), json.loads(self.string(s1)), row+1)
+
+
+class LogicPackWriter:
+    """
+    Compiles logic and tuning files into a logicpack.
+    """
+    def __init__(self, wad_name):
+        self.string_ids = {}
+        self.string_list = []
+        self.rows = []
+        self.aux = []
+        self.nlogic = 0
+        self.intern(wad_name)
+
+    def intern(self, string):
+        if string is None:
+            return NONE
+        if string not in self.string_ids:
+            self.string_ids[string] = len(self.string_list)
+            self.string_list.append(string)
+        return self.string_ids[string]
+
+    def put_pos(self, pos):
+        """Returns (flags, map, x, y, z) for the given position."""
+        if len(pos) == 4 and all(type(c) is int for c in pos[1:]):
+            return (0, self.intern(pos[0]), *pos[1:])
+        offset = len(self.aux)
+        self.aux.append(len(pos) - 1)
+        for atom in pos[1:]:
+            if type(atom) is int and -0x80000000 <= atom < 0x80000000:
+                self.aux += [ATOM_INT, atom & 0xFFFFFFFF]
+            elif type(atom) is str:
+                self.aux += [ATOM_STR, self.intern(atom)]
+            else:
+                self.aux += [ATOM_JSON, self.intern(json.dumps(atom))]
+        return (POS_AUX, self.intern(pos[0]), offset, 0, 0)
+
+    def put_generic(self, evt, payload):
+        self.rows.append((GENERIC, 0, 0, self.intern(evt), self.intern(json.dumps(payload, separators=(',', ':'))), NONE, NONE, NONE, 0, 0, 0))
+
+    def put_item(self, payload):
+        if not set(payload.keys()) <= ITEM_FIELDS:
+            return False
+        flags = 0
+        filter = 0
+        if 'filter' in payload:
+            flags |= ITEM_FILTER
+            filter = payload['filter']
+        if 'skill' in payload:
+            flags |= ITEM_SKILL
+            filter = sum(1 << skill for skill in payload['skill'])
+        if payload.get('secret', False):
+            flags |= ITEM_SECRET
+        if 'tid' in payload:
+            flags |= ITEM_TID
+        (pos_flags, map, x, y, z) = self.put_pos(payload['pos'])
+        self.rows.append((
+            ITEM, flags | pos_flags, filter,
+            self.intern(payload['category']), self.intern(payload['typename']), self.intern(payload['tag']),
+            map, payload.get('tid', NONE), x, y, z))
+        return True
+
+    def add_logic(self, records):
+        assert self.nlogic == len(self.rows), 'All logic must be added before tuning'
+        for evt, payload, _ in records:
+            if evt != 'AP-ITEM' or not self.put_item(payload):
+                self.put_generic(evt, payload)
+        self.nlogic = len(self.rows)
+
+    def add_tuning(self, records):
+        """
+        Add tuning records to the pack.
+
+        AP-CHECK records are merged by position. This replicates the way that
+        DoomLocation.record_tuning accumulates tuning data, so that replaying
+        the merged record has the same effect as replaying all of the originals.
+        """
+        checks = {}
+        for evt, payload, _ in records:
+            if evt != 'AP-CHECK':
+                self.put_generic(evt, payload)
+                continue
+
+            keys = payload.get('keys', None)
+            region = payload.get('region', None)
+            unreachable = payload.get('unreachable', None)
+            if keys is None and region is None and unreachable is None:
+                continue
+
+            key = json.dumps(payload['pos'])
+            check = checks.setdefault(key, {
+                'id': payload.get('id', None), 'name': payload.get('name', None), 'pos': payload['pos'],
+                'region': None, 'unreachable': None, 'keysets': [],
+            })
+            if region:
+                assert not check['region'] or check['region'] == region, f'Location {check["name"]} is listed as both in region {check["region"]} and in region {region}'
+                check['region'] = region
+            elif check['region']:
+                print(f"Ignoring tuning for location '{check['name']}' that tries to remove it from region {check['pos'][0]}/{check['region']}")
+                continue
+            if unreachable is not None:
+                check['unreachable'] = unreachable
+            if keys is not None:
+                check['keysets'].append(frozenset(k if '/' in k else 'key/'+k for k in keys))
+
+        for check in checks.values():
+            flags = 0
+            if check['unreachable'] is not None:
+                flags |= CHECK_UNREACHABLE_SET
+                if check['unreachable']:
+                    flags |= CHECK_UNREACHABLE
+            if check['id'] is not None:
+                flags |= CHECK_ID
+            keysets = NONE
+            if check['keysets']:
+                keysets = len(self.aux)
+                minimal = sorted(sorted(ks) for ks in minimize_keysets(check['keysets']))
+                self.aux.append(len(minimal))
+                for ks in minimal:
+                    self.aux.append(len(ks))
+                    self.aux += [self.intern(k) for k in ks]
+            (pos_flags, map, x, y, z) = self.put_pos(check['pos'])
+            self.rows.append((
+                CHECK, flags | pos_flags, 0,
+                self.intern(check['name']), self.intern(check['region']), keysets,
+                map, check['id'] if check['id'] is not None else NONE, x, y, z))
+
+    def write(self, path):
+        blobs = [s.encode('utf-8') for s in self.string_list]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        strings = b''.join(blobs)
+        strings += b'\0' * (-len(strings) % 4)
+
+        with open(path, 'wb') as fd:
+            fd.write(HEADER.pack(
+                MAGIC, VERSION, 0, len(self.string_list), offsets[-1],
+                self.nlogic, len(self.rows) - self.nlogic, len(self.aux)))
+            fd.write(struct.pack(f'<{len(offsets)}I', *offsets))
+            fd.write(strings)
+            for row in self.rows:
+                fd.write(ROW.pack(*row))
+            fd.write(struct.pack(f'<{len(self.aux)}I', *self.aux))
+
+
+def build_logicpack(out, logic_files, tuning_files):
+    """
+    Compile the given logic and tuning files into a logicpack at `out`. Files
+    are processed in the order given, which should be the same order the loader
+    would use for them, i.e. sorted by name.
+    """
+    writer = LogicPackWriter(Path(logic_files[0]).name.split('.')[0])
+    for file in logic_files:
+        writer.add_logic(read_text_records(Path(file)))
+    writer.add_tuning(
+        record
+        for file in tuning_files
+        for record in read_text_records(Path(file)))
+    writer.write(out)
+
+
+def main(argv):
+    """
+    Usage: logicpack.py OUTFILE LOGIC_DIR TUNING_DIR
+    """
+    (out, logic_dir, tuning_dir) = argv
+    logic_files = sorted(p for p in Path(logic_dir).iterdir() if p.is_file())
+    tuning_files = sorted(p for p in Path(tuning_dir).iterdir() if p.is_file()) if Path(tuning_dir).is_dir() else []
+    build_logicpack(out, logic_files, tuning_files)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -2,41 +2,95 @@
 Location/region access prerequisites.
 
 This library contains functions for turning textual prerequisites like
-'key/RedCard' or 'map/E1M1/belltower' into location access rule functions.
-
-TODO: we should use the new rule builder API in AP 0.6.7 once it's released.
+'key/RedCard' or 'map/E1M1/belltower' into location access rules. The rules are
+put together using the combinators of the world's rule cache, so what kind of
+rule they produce depends on which rule backend is in use; see rules.py.
 '''
 
-from typing import FrozenSet
+from typing import Collection, Dict, FrozenSet, Tuple
+
+class PrereqTerm(str):
+  '''
+  A single prereq, like 'key/RedCard', already split into its kind ('key') and
+  arguments (('RedCard',)). It's still a str, so it compares and hashes the
+  same as the unparsed prereq and can be used anywhere one is expected.
+  '''
+  kind: str
+  args: Tuple[str, ...]
+
+  def __new__(cls, string):
+    term = super().__new__(cls, string)
+    fields = string.split('/')
+    term.kind = fields[0]
+    term.args = tuple(fields[1:])
+    return term
+
+class PrereqTable:
+  '''
+  Per-wad table of interned prereqs.
+
+  Each distinct prereq string is parsed into a PrereqTerm once, and every
+  location, region, and map that uses it shares that term. Identical keysets
+  and or-of-ands are likewise shared, since large wads have thousands of
+  locations with exactly the same requirements.
+  '''
+  terms: Dict[str, PrereqTerm]
+  keysets: Dict[FrozenSet[str], FrozenSet[PrereqTerm]]
+  prereqs: Dict[FrozenSet[FrozenSet[str]], FrozenSet[FrozenSet[PrereqTerm]]]
+
+  def __init__(self):
+    self.terms = {}
+    self.keysets = {}
+    self.prereqs = {}
+
+  def term(self, string: str) -> PrereqTerm:
+    term = self.terms.get(string)
+    if term is None:
+      term = self.terms[string] = PrereqTerm(string)
+    return term
+
+  def keyset(self, keyset: Collection[str]) -> FrozenSet[PrereqTerm]:
+    keyset = frozenset(keyset)
+    interned = self.keysets.get(keyset)
+    if interned is None:
+      interned = self.keysets[keyset] = frozenset(self.term(term) for term in keyset)
+    return interned
+
+  def intern(self, prereqs: FrozenSet[FrozenSet[str]] | None) -> FrozenSet[FrozenSet[PrereqTerm]] | None:
+    if prereqs is None:
+      return None
+    interned = self.prereqs.get(prereqs)
+    if interned is None:
+      interned = self.prereqs[prereqs] = frozenset(self.keyset(keyset) for keyset in prereqs)
+    return interned
 
 def strings_to_prereq_fn(world, wad, map, xs):
-  rules = [string_to_prereq_fn(world, wad, map, x) for x in xs]
-  return lambda state: all(rule(state) for rule in rules)
+  return world.rule_cache.all_of([string_to_prereq_fn(world, wad, map, x) for x in xs])
 
 def string_to_prereq_fn(world, wad, map, string):
   # print('string_to_prereq', wad.name, map.map, string)
-  fields = string.split('/')
+  term = string if isinstance(string, PrereqTerm) else wad.prereq_terms.term(string)
 
-  match fields[0]:
+  match term.kind:
     case 'fqin':  # fqin/ITEMNAME[/COUNT]
-      return fqin_prereq(world, wad, map, *fields[1:])
+      return fqin_prereq(world, wad, map, *term.args)
     case 'key':  # key/TYPENAME[/COUNT]
-      return key_prereq(world, wad, map, *fields[1:])
+      return key_prereq(world, wad, map, *term.args)
     case 'item':  # item/TYPENAME[/COUNT]
-      return item_prereq(world, wad, map, *fields[1:])
+      return item_prereq(world, wad, map, *term.args)
     case 'map':  # map/MAP[/SUBREGION]
-      return region_prereq(world, wad, map, *fields[1:])
+      return region_prereq(world, wad, map, *term.args)
     case 'weapon':  # weapon/TYPENAME/{want,need}
-      return weapon_prereq(world, wad, map, *fields[1:])
+      return weapon_prereq(world, wad, map, *term.args)
     case 'flag':  # flag/FLAGNAME
       # Flags don't impose prerequisites but instead change other things about
       # the region or location.
-      return lambda state: True
+      return world.rule_cache.always
     case _:
       raise RuntimeError(f'Unknown prerequisite {string}')
 
 def fqin_prereq(world, wad, map, fqin, count=1):
-  return lambda state: state.has(fqin, world.player, int(count))
+  return world.rule_cache.has(fqin, count)
 
 def item_prereq(world, wad, map, typename, count=1):
   return fqin_prereq(world, wad, map, wad.items_by_type[typename].name())
@@ -48,23 +102,23 @@ def weapon_in_pool(world, wad, map, typename):
 
 def weapon_prereq(world, wad, map, typename, strictness = 'need'):
   if strictness == 'need':
-    has_global_cap = fqin_prereq(world, wad, map, wad.weapon_capability(typename))
-    has_local_cap = fqin_prereq(world, wad, map, wad.weapon_capability(typename, map.map))
-    return lambda state: has_global_cap(state) or has_local_cap(state)
+    return world.rule_cache.any_of([
+      fqin_prereq(world, wad, map, wad.weapon_capability(typename)),
+      fqin_prereq(world, wad, map, wad.weapon_capability(typename, map.map))])
   elif strictness == 'want':
     if world.options.combat_logic_mode.is_enabled():
       if weapon_in_pool(world, wad, map, typename):
         return weapon_prereq(world, wad, map, typename, 'need')
       else:
         print(f'Dropping prerequisite weapon/{typename}/want in {map.map} because no such weapon exists')
-        return lambda _: True
+        return world.rule_cache.always
     else:
-      return lambda _: True
+      return world.rule_cache.always
   elif strictness == 'auto':
     if world.options.combat_logic_mode.is_auto():
       return weapon_prereq(world, wad, map, typename, 'need')
     else:
-      return lambda _: True
+      return world.rule_cache.always
   else:
     assert False, f'Unknown strictness in weapon prereq weapon/{typename}/{strictness}'
 
@@ -78,11 +132,10 @@ def weapon_from_hint(prereq):
 def key_prereq(world, wad, map, typename, count=1):
   if typename == '*':
     # match any key in cluster
-    prereqs = [
+    return world.rule_cache.any_of([
       fqin_prereq(world, wad, map, key.fqin())
       for key in sorted(map.keyset)
-    ]
-    return lambda state: sum(p(state) for p in prereqs) > 0
+    ])
   else:
     return fqin_prereq(world, wad, map, map.key_by_type(typename).fqin(), count)
 
@@ -0,0 +1,315 @@
+'''
+Typed records for the AP-* events in logic and tuning files.
+
+Each event type that the loader cares about has a record class here listing
+the fields it may contain and their types. Records are validated once, when
+they're decoded, so that malformed scanner output produces an error naming
+the offending field rather than a TypeError from somewhere inside DoomWad, and
+DoomWad can then use the fields directly rather than picking them out of a
+dict.
+
+The JSON decoding itself is pluggable. If msgspec is installed, records are
+decoded and validated by msgspec without building an intermediate dict;
+otherwise, if orjson is installed, it's used to decode the JSON, and failing
+that we fall back to the stdlib json module. Set GZAP_JSON_BACKEND to
+"msgspec", "orjson", or "json" to force a specific one.
+
+Whichever backend is used, the same file must load (or fail to) the same way,
+so they all apply the same rules: unknown fields are an error, and field types
+are checked all the way down, so e.g. List[str] rejects a list containing a
+number, and int rejects true and false.
+'''
+
+from dataclasses import MISSING, dataclass, field, fields
+import json
+import os
+import reprlib
+from types import UnionType
+from typing import Any, Dict, List, Union, get_args, get_origin
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RecordSchemaError(ValueError):
+    pass
+
+
+@dataclass
+class ScanRecord:
+    EVENT = 'AP-SCAN'
+    flags: List[str]
+
+
+@dataclass
+class MapRecord:
+    EVENT = 'AP-MAP'
+    map: str
+    checksum: str
+    info: Dict[str,Any]
+    levelname: str | None = None
+    episodename: str | None = None
+    clustername: str | None = None
+    monster_count: int = 0
+    monsters: Dict[str,int] = field(default_factory=dict)
+    prereqs: List[str] = field(default_factory=list)
+    rank: int = 0
+
+
+def spawn_filter(record) -> int:
+    '''
+    Returns the spawn filter for an item or secret record, which can be given
+    either directly as a filter bitmask or as a list of skill levels.
+    '''
+    if record.filter is not None and record.skill is not None:
+        raise RecordSchemaError(f"{record.EVENT} record has both `skill` and `filter` fields")
+    if record.filter is not None:
+        return record.filter
+    elif record.skill is not None:
+        filter = 0
+        if 1 in record.skill:
+            filter |= 0x03 # ITYTD and HNTR
+        if 2 in record.skill:
+            filter |= 0x04 # HMP
+        if 3 in record.skill:
+            filter |= 0x18 # UV and NM
+        return filter
+    else:
+        return 0xFF
+
+
+@dataclass
+class ItemRecord:
+    EVENT = 'AP-ITEM'
+    category: str
+    typename: str
+    tag: str
+    pos: List[Any]
+    filter: int | None = None
+    skill: List[int] | None = None
+    secret: bool = False
+    name: str | None = None
+    tid: int | None = None
+
+    spawn_filter = spawn_filter
+
+
+@dataclass
+class SecretRecord:
+    EVENT = 'AP-SECRET'
+    pos: List[Any]
+    filter: int | None = None
+    skill: List[int] | None = None
+    name: str | None = None
+
+    spawn_filter = spawn_filter
+
+
+@dataclass
+class KeyRecord:
+    EVENT = 'AP-KEY'
+    tag: str
+    typename: str
+    scopename: str
+    cluster: int
+    maps: List[str]
+
+
+@dataclass
+class RegionRecord:
+    EVENT = 'AP-REGION'
+    map: str
+    keys: List[Any]
+    region: str | None = None
+
+
+@dataclass
+class CheckRecord:
+    EVENT = 'AP-CHECK'
+    id: int | None
+    name: str
+    pos: List[Any]
+    keys: List[Any] | None = None
+    region: str | None = None
+    unreachable: bool | None = None
+
+
+RECORD_TYPES = {
+    cls.EVENT: cls
+    for cls in [ScanRecord, MapRecord, ItemRecord, SecretRecord, KeyRecord, RegionRecord, CheckRecord]
+}
+
+
+def type_name(annotation) -> str:
+    if annotation is Any:
+        return 'anything'
+    if annotation is type(None):
+        return 'null'
+    origin = get_origin(annotation)
+    if origin in (Union, UnionType):
+        return ' or '.join(type_name(arg) for arg in get_args(annotation))
+    if origin is list:
+        return f'list of {type_name(get_args(annotation)[0])}'
+    if origin is dict:
+        return f'dict of {type_name(get_args(annotation)[1])}'
+    return annotation.__name__
+
+def type_checker(annotation):
+    '''
+    Convert a field annotation into a predicate that checks whether a decoded
+    JSON value matches it. This checks the contents of lists and dicts as well,
+    and doesn't accept bools as ints, to match what msgspec does.
+    '''
+    if annotation is Any:
+        return lambda value: True
+    origin = get_origin(annotation)
+    if origin in (Union, UnionType):
+        checkers = [type_checker(arg) for arg in get_args(annotation)]
+        return lambda value: any(check(value) for check in checkers)
+    if origin is list:
+        (elem,) = get_args(annotation)
+        if elem is Any:
+            return lambda value: type(value) is list
+        check_elem = type_checker(elem)
+        return lambda value: type(value) is list and all(check_elem(v) for v in value)
+    if origin is dict:
+        (key, val) = get_args(annotation)
+        check_key = type_checker(key)
+        check_val = type_checker(val)
+        return lambda value: type(value) is dict and all(
+            check_key(k) and check_val(v) for k,v in value.items())
+    if annotation is int:
+        return lambda value: type(value) is int
+    if annotation is type(None):
+        return lambda value: value is None
+    return lambda value: isinstance(value, annotation)
+
+FIELD_TYPES = {
+    cls: [(f.name, type_checker(f.type), type_name(f.type)) for f in fields(cls)]
+    for cls in RECORD_TYPES.values()
+}
+
+
+def from_json(cls, payload):
+    '''
+    Build and validate a record of the given type from decoded JSON.
+    '''
+    if not isinstance(payload, dict):
+        raise RecordSchemaError(f"{cls.EVENT} record should be a JSON object, not {type(payload).__name__}")
+    try:
+        record = cls(**payload)
+    except TypeError as e:
+        # Missing or unexpected fields.
+        raise RecordSchemaError(f"Malformed {cls.EVENT} record: {e}") from None
+    for name,check,expected in FIELD_TYPES[cls]:
+        value = getattr(record, name)
+        if not check(value):
+            raise RecordSchemaError(f"Malformed {cls.EVENT} record: field `{name}` should be {expected}, not {reprlib.repr(value)}")
+    return record
+
+
+def to_record(evt, payload):
+    '''
+    Convert a decoded payload into a record, if evt is a type of record we know
+    about. Payloads that are already records, or that are for events we don't
+    have records for, are returned unchanged.
+    '''
+    cls = RECORD_TYPES.get(evt)
+    if cls is None or isinstance(payload, cls):
+        return payload
+    return from_json(cls, payload)
+
+
+class JSONBackend:
+    name = 'json'
+    errors = (ValueError,)
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def decode(self, evt, text):
+        '''
+        Decode the payload of an AP-* record into a record object, or into plain
+        JSON if it's an event we don't have a record type for.
+        '''
+        try:
+            payload = self.loads(text)
+        except self.errors as e:
+            raise RecordSchemaError(f"Malformed JSON in {evt} record: {e}") from e
+        return to_record(evt, payload)
+
+class OrjsonBackend(JSONBackend):
+    name = 'orjson'
+
+    def __init__(self):
+        self.errors = (orjson.JSONDecodeError,)
+        self.loads = orjson.loads
+
+def record_struct(cls):
+    '''
+    Define a msgspec Struct with the same fields as the given record class.
+    Decoding into a dataclass would silently drop unknown fields, so we decode
+    into one of these, which doesn't, and then convert.
+    '''
+    struct_fields = []
+    for f in fields(cls):
+        if f.default is not MISSING:
+            struct_fields.append((f.name, f.type, f.default))
+        elif f.default_factory is not MISSING:
+            struct_fields.append((f.name, f.type, msgspec.field(default_factory=f.default_factory)))
+        else:
+            struct_fields.append((f.name, f.type))
+    return msgspec.defstruct(cls.__name__, struct_fields, forbid_unknown_fields=True)
+
+class MsgspecBackend(JSONBackend):
+    name = 'msgspec'
+
+    def __init__(self):
+        self.errors = (msgspec.DecodeError,)
+        self.loads = msgspec.json.Decoder().decode
+        self.decoders = {
+            evt: (cls, msgspec.json.Decoder(type=record_struct(cls)))
+            for evt,cls in RECORD_TYPES.items()
+        }
+
+    def decode(self, evt, text):
+        if evt not in self.decoders:
+            return super().decode(evt, text)
+        (cls, decoder) = self.decoders[evt]
+        try:
+            struct = decoder.decode(text)
+        except msgspec.ValidationError as e:
+            raise RecordSchemaError(f"Malformed {evt} record: {e}") from e
+        except self.errors as e:
+            raise RecordSchemaError(f"Malformed JSON in {evt} record: {e}") from e
+        return cls(*msgspec.structs.astuple(struct))
+
+
+BACKENDS = {
+    'msgspec': MsgspecBackend if msgspec else None,
+    'orjson': OrjsonBackend if orjson else None,
+    'json': JSONBackend,
+}
+
+def select_backend(name = None) -> JSONBackend:
+    '''
+    Returns the named JSON backend, or the fastest one available if no name is
+    given or the named one isn't installed.
+    '''
+    if name and BACKENDS.get(name):
+        return BACKENDS[name]()
+    if name:
+        print(f"Warning: JSON backend '{name}' is not available; choose one of {[k for k,v in BACKENDS.items() if v]}")
+    return next(backend for backend in BACKENDS.values() if backend)()
+
+backend = select_backend(os.environ.get("GZAP_JSON_BACKEND"))
+
+def decode_record(evt, text):
+    return backend.decode(evt, text)
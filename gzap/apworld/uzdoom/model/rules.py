@@ -0,0 +1,423 @@
+'''
+Shared access rules, and the backends that build them.
+
+Every location, region, and map gets an access rule built from its prereqs, an
+or-of-ands of prereq strings (see prereqs.py, which turns individual prereqs
+into rules using the combinators provided here). Large wads have thousands of
+locations but only a handful of distinct prereqs per map, so rather than each
+location getting its own rule, each world has a RuleCache that builds one rule
+per distinct (map, prereqs) and hands that same rule out to everything that
+needs it.
+
+There are two backends:
+- the closure backend, which turns prereqs into plain Python functions. These
+  are opaque to AP, so to avoid re-evaluating the same rule over and over during
+  fill, each shared rule memoizes its result in the CollectionState. Our rules
+  depend only on what items the player has, so memoized results stay valid until
+  an item is collected or removed, at which point the world calls invalidate()
+  to discard them.
+- the rule builder backend, which turns prereqs into the declarative rule
+  objects from AP's rule_builder, which AP can analyze and cache itself. The
+  world then also inherits AP's RuleWorldMixin, and rules are applied with its
+  set_rule(). This needs a version of AP that includes the rule builder.
+
+Rules for maps and regions are likewise built once per world and shared by
+everything that refers to them, however many places that is.
+
+The closure backend is the default. Set GZAP_RULE_BACKEND to "builder" to use
+the rule builder backend instead, if it's available.
+'''
+
+from abc import ABC, abstractmethod
+import os
+from typing import Dict, FrozenSet, Set, Tuple
+
+from . import prereqs
+
+try:
+    from rule_builder import RuleWorldMixin
+    from rule_builder.rules import And, CanReachRegion, False_, Has, Or, True_
+except ImportError:
+    RuleWorldMixin = None
+
+# Attribute of CollectionState that memoized results are stored in. It's a dict
+# of player -> rule index -> result, so that several worlds can share a state.
+STATE_ATTR = 'uzdoom_rule_results'
+
+
+class RuleCache(ABC):
+    '''
+    Per-world cache of access rules. Subclasses decide what a rule actually is,
+    by implementing the rule combinators (always, never, has(), all_of(), and
+    any_of()), and how it's applied to a location or entrance (set_rule()).
+
+    Anything that depends on the world rather than the state -- options,
+    Universal Tracker, starting levels, hublogic, etc -- is fixed for the
+    lifetime of the world, so it's decided here when the rule is built, and
+    the rules themselves only check the player's items.
+    '''
+    name = None
+    # Classes the world needs to inherit from to use this backend.
+    world_mixins: Tuple[type,...] = ()
+    world: 'UZDoomWorld'
+    # Rules for individual prereq terms, keyed on (map name, term).
+    terms: Dict[Tuple[str,str],object]
+    # Rules for whole or-of-ands, keyed on (map name, prereqs).
+    rules: Dict[Tuple[str,FrozenSet[FrozenSet[str]]],object]
+    # Rules for whole maps, keyed on map name.
+    maps: Dict[str,object]
+    # Rules for regions, keyed on (region name, name of the map they're
+    # evaluated in the context of).
+    regions: Dict[Tuple[str,str],object]
+    # Names of maps and regions whose rules are currently being built, and of
+    # those that we've had to refer to by reachability instead; see reference().
+    building: Set[str]
+    indirect: Set[str]
+    # Weapons found in each map, and weapons required by combat logic in each
+    # map, keyed on map name.
+    local_weapons_by_map: Dict[str,'Counter[str]']
+    weapons: Dict[str,FrozenSet[str]]
+    # Rules that always and never succeed.
+    always: object
+    never: object
+
+    def __init__(self, world):
+        self.world = world
+        self.terms = {}
+        self.rules = {}
+        self.maps = {}
+        self.regions = {}
+        self.building = set()
+        self.indirect = set()
+        self.local_weapons_by_map = {}
+        self.weapons = {}
+
+    def term_rule(self, wad, map, term: str):
+        key = (map.map, term)
+        rule = self.terms.get(key)
+        if rule is None:
+            rule = self.terms[key] = self.make_term_rule(wad, map, term)
+        return rule
+
+    def prereqs_rule(self, wad, map, prereqs: FrozenSet[FrozenSet[str]]):
+        '''
+        Returns a rule that succeeds if all the prereqs in any one of the keysets
+        in prereqs are satisfied, in the context of the given map.
+        '''
+        key = (map.map, prereqs)
+        rule = self.rules.get(key)
+        if rule is None:
+            keysets = [
+                [self.term_rule(wad, map, term) for term in keyset]
+                for keyset in prereqs
+            ]
+            rule = self.rules[key] = self.make_prereqs_rule(keysets)
+        return rule
+
+    def make_term_rule(self, wad, map, term: str):
+        return prereqs.string_to_prereq_fn(self.world, wad, map, term)
+
+    def make_prereqs_rule(self, keysets):
+        return self.any_of([self.all_of(keyset) for keyset in keysets])
+
+    @abstractmethod
+    def has(self, fqin: str, count = 1):
+        '''Returns a rule that succeeds if the player has at least count of fqin.'''
+
+    @abstractmethod
+    def can_reach_region(self, name: str):
+        '''Returns a rule that succeeds if AP can reach the named region.'''
+
+    @abstractmethod
+    def all_of(self, rules):
+        '''Returns a rule that succeeds if all of the given rules do.'''
+
+    @abstractmethod
+    def any_of(self, rules):
+        '''Returns a rule that succeeds if any of the given rules do.'''
+
+    def set_rule(self, spot, rule) -> None:
+        '''
+        Makes rule the access rule for spot, a location or entrance.
+        '''
+        spot.access_rule = rule
+
+    def reachable_rule(self, reachable, wad, map):
+        '''
+        Returns the access rule for a location or region, evaluated in the
+        context of the given map.
+        '''
+        world = self.world
+        if hasattr(world.multiworld, "generation_is_fake"):
+            # If Universal Tracker is generating, pretend that locations
+            # with the unreachable flag are unreachable always, so they
+            # don't show up in the tracker.
+            # Also consider everything unreachable in pretuning mode, because
+            # in pretuning the idea of "logic" kind of goes out the window
+            # entirely.
+            if reachable.unreachable or world.options.pretuning_mode:
+                return self.never
+
+        # Skip all checks in pretuning mode -- we know that the logic is
+        # beatable because it's the vanilla game.
+        if world.options.pretuning_mode:
+            return self.always
+
+        # If this location has no prerequisites, trivially succeed.
+        if not reachable.prereqs:
+            return self.always
+
+        # If keys are forced to be in vanilla locations, assume that all
+        # items are reachable since key-based progression will work as normal.
+        # TODO: replace with a more sophisticated check that confirms that
+        # *all* items we have as prereqs have vanilla location placement.
+        if world.options.included_item_categories.all_keys_are_vanilla:
+            return self.always
+
+        # Prereqs is an or-of-ands, so if any prereq succeeds, the rule
+        # succeeds.
+        return self.prereqs_rule(wad, map, reachable.prereqs)
+
+    def reference(self, registry, key, name: str, build):
+        '''
+        Returns the rule for the map or region with the given name from registry,
+        calling build() to make it if it doesn't exist yet.
+
+        If the rule for that map or region is already being built, we've found a
+        cycle, which we can't express as nested rules; instead the reference is
+        turned into a check for whether AP can reach the corresponding region,
+        which AP resolves by following region connections.
+        '''
+        rule = registry.get(key)
+        if rule is not None:
+            return rule
+        if name in self.building:
+            return self.reach_region(name)
+        self.building.add(name)
+        try:
+            rule = registry[key] = build()
+        finally:
+            self.building.discard(name)
+        return rule
+
+    def reach_region(self, name: str):
+        if name.split('/')[0] not in {map.map for map in self.world.maps}:
+            # Maps that aren't included don't get a region, and can't be reached.
+            return self.never
+        print(f'Warning: cyclic reference to {name}; checking region reachability instead.')
+        self.indirect.add(name)
+        return self.can_reach_region(name)
+
+    def register_indirect_conditions(self, entrances) -> None:
+        '''
+        Tells AP that the given entrances' rules may depend on whether the regions
+        we've had to check reachability of can be reached. Shared rules can end up
+        anywhere, so we don't try to work out which entrances actually need it.
+        '''
+        multiworld = self.world.multiworld
+        for name in sorted(self.indirect):
+            region = multiworld.get_region(name, self.world.player)
+            for entrance in entrances:
+                multiworld.register_indirect_condition(region, entrance)
+
+    def region_rule(self, region, wad, map):
+        '''
+        Returns the access rule for a region, evaluated in the context of the
+        given map.
+        '''
+        return self.reference(
+            self.regions, (region.name(), map.map), region.name(),
+            lambda: self.reachable_rule(region, wad, map))
+
+    def map_rule(self, map):
+        '''
+        Returns the access rule for a whole map.
+        '''
+        return self.reference(self.maps, map.map, map.map, lambda: self.make_map_rule(map))
+
+    def make_map_rule(self, map):
+        world = self.world
+        if world.options.pretuning_mode:
+            return self.always
+
+        rules = [self.has(map.access_flag_name())]
+        if map.extra_rules.prereqs:
+            rules.append(self.reachable_rule(map.extra_rules, map.wad, map))
+
+        # Starting levels are exempt from all balancing checks, and if hublogic
+        # is on, we skip per-map weapon logic.
+        # TODO: we should be better about this, exclude rank 0 levels from
+        # carryover checks but still apply them to later starting levels
+        # if possible.
+        if not world.is_starting_map(map.map) and not map.wad.use_hub_logic():
+            weapons = [
+                self.term_rule(world.wad_logic, map, f'weapon/{weapon}/need')
+                for weapon in sorted(self.combat_logic_weapons(map))
+            ]
+            # If Universal Tracker is asking for "glitch logic", skip all balancing
+            # checks and report everything the player can get to whether they have
+            # the firepower to keep it or not.
+            if weapons:
+                rules.append(self.any_of([self.has(world.glitches_item_name), self.all_of(weapons)]))
+
+        return self.all_of(rules)
+
+    def local_weapons(self, map) -> 'Counter[str]':
+        '''
+        Returns map.local_weapons(). Every later map in the same episode needs
+        these for its combat logic, so we only work them out once per map.
+        '''
+        weapons = self.local_weapons_by_map.get(map.map)
+        if weapons is None:
+            weapons = self.local_weapons_by_map[map.map] = map.local_weapons(self.world)
+        return weapons
+
+    def combat_logic_weapons(self, map) -> FrozenSet[str]:
+        '''
+        Returns map.combat_logic_weapons(). Working this out means looking at
+        every earlier map in the episode, so we only do it once per map.
+        '''
+        weapons = self.weapons.get(map.map)
+        if weapons is None:
+            weapons = self.weapons[map.map] = map.combat_logic_weapons(self.world)
+        return weapons
+
+    def invalidate(self, state) -> None:
+        pass
+
+
+class ClosureRuleCache(RuleCache):
+    name = 'closure'
+
+    def __init__(self, world):
+        super().__init__(world)
+        self.always = lambda _: True
+        self.never = lambda _: False
+
+    def make_prereqs_rule(self, keysets):
+        return self.memoize(super().make_prereqs_rule(keysets))
+
+    def has(self, fqin: str, count = 1):
+        player = self.world.player
+        count = int(count)
+        return lambda state: state.has(fqin, player, count)
+
+    def can_reach_region(self, name: str):
+        player = self.world.player
+        return lambda state: state.can_reach_region(name, player)
+
+    def all_of(self, rules):
+        if not rules:
+            return self.always
+        if len(rules) == 1:
+            return rules[0]
+        rules = tuple(rules)
+
+        def rule(state):
+            for term in rules:
+                if not term(state):
+                    return False
+            return True
+
+        return rule
+
+    def any_of(self, rules):
+        if not rules:
+            return self.never
+        if len(rules) == 1:
+            return rules[0]
+        rules = tuple(rules)
+
+        def rule(state):
+            for term in rules:
+                if term(state):
+                    return True
+            return False
+
+        return rule
+
+    def memoize(self, fn):
+        index = len(self.rules)
+        player = self.world.player
+        # Region reachability can change without our items changing, so if we've
+        # had to check it anywhere, we can't memoize anything.
+        indirect = self.indirect
+
+        def rule(state):
+            if indirect:
+                return fn(state)
+            cache = state.__dict__.get(STATE_ATTR)
+            if cache is None:
+                cache = state.__dict__[STATE_ATTR] = {}
+            results = cache.get(player)
+            if results is None:
+                results = cache[player] = {}
+            result = results.get(index)
+            if result is None:
+                result = results[index] = fn(state)
+            return result
+
+        return rule
+
+    def invalidate(self, state) -> None:
+        cache = state.__dict__.get(STATE_ATTR)
+        if cache:
+            cache.pop(self.world.player, None)
+
+
+class BuilderRuleCache(RuleCache):
+    '''
+    Rule builder backend. Rules are applied with the world's set_rule() from
+    RuleWorldMixin, which resolves them and takes care of caching their results
+    and of tracking which regions they depend on.
+    '''
+    name = 'builder'
+    world_mixins = (RuleWorldMixin,)
+
+    def __init__(self, world):
+        super().__init__(world)
+        self.always = True_()
+        self.never = False_()
+
+    def set_rule(self, spot, rule) -> None:
+        self.world.set_rule(spot, rule)
+
+    def has(self, fqin: str, count = 1):
+        return Has(fqin, count=int(count))
+
+    def can_reach_region(self, name: str):
+        return CanReachRegion(name)
+
+    def all_of(self, rules):
+        if not rules:
+            return self.always
+        if len(rules) == 1:
+            return rules[0]
+        return And(*rules)
+
+    def any_of(self, rules):
+        if not rules:
+            return self.never
+        if len(rules) == 1:
+            return rules[0]
+        return Or(*rules)
+
+
+BACKENDS = {
+    'closure': ClosureRuleCache,
+    'builder': BuilderRuleCache if RuleWorldMixin else None,
+}
+
+def select_backend(name = None) -> type:
+    '''
+    Returns the named rule backend, or the closure backend if no name is given
+    or the named one isn't available.
+    '''
+    if not name:
+        return ClosureRuleCache
+    if BACKENDS.get(name):
+        return BACKENDS[name]
+    print(f"Warning: rule backend '{name}' is not available; choose one of {[k for k,v in BACKENDS.items() if v]}")
+    return ClosureRuleCache
+
+backend = select_backend(os.environ.get("GZAP_RULE_BACKEND"))
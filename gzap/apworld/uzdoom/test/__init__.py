@@ -0,0 +1,31 @@
+"""
+Tests for the uzdoom apworld. These are run by Archipelago's test runner, e.g.
+`python -m pytest worlds/uzdoom/test` from the AP source tree.
+"""
+
+from pathlib import Path
+
+# The logic and tuning sources for the bundled wads. These only exist in a
+# checkout of the gzap repo, not in a built apworld, so tests that need them
+# are skipped if they aren't there.
+SOURCE_WADS = Path(__file__).resolve().parents[3] / "wads"
+
+def source_wads():
+    """Returns (name, logic_files, tuning_files) for each bundled wad."""
+    if not SOURCE_WADS.is_dir():
+        return []
+    wads = []
+    for wad_dir in sorted(SOURCE_WADS.iterdir()):
+        logic = sorted(wad_dir.glob("*.logic*"))
+        if logic:
+            wads.append((wad_dir.name, logic, sorted(wad_dir.glob("*.tuning*"))))
+    return wads
+
+def wad_world_types():
+    """Returns the world types for all installed wad apworlds."""
+    from worlds.AutoWorld import AutoWorldRegister
+    from .. import UZDoomWorld
+    return [
+        world_type for world_type in AutoWorldRegister.world_types.values()
+        if issubclass(world_type, UZDoomWorld) and world_type.wad_package
+    ]
@@ -0,0 +1,44 @@
+import unittest
+
+from Options import ExcludeLocations, LocalItems, PlandoOptions
+
+from . import wad_world_types
+
+
+def composite_group(groups):
+    """
+    Find a composite group that isn't the same as either of its parts, or None
+    if there aren't any.
+    """
+    names = sorted(name for name in groups if "-" not in name and name not in ("Everything", "Everywhere"))
+    for i,first in enumerate(names):
+        for second in names[i+1:]:
+            both = set(groups[first]) & set(groups[second])
+            if both and both != set(groups[first]) and both != set(groups[second]):
+                return (f"{first}-{second}", both)
+    return None
+
+
+class TestCompositeGroups(unittest.TestCase):
+    def test_options_accept_composite_groups(self):
+        world_types = wad_world_types()
+        if not world_types:
+            self.skipTest("no wad apworlds installed")
+
+        for world_type in world_types:
+            with self.subTest(game=world_type.game):
+                for option_type, groups in [
+                        (LocalItems, world_type.item_name_groups),
+                        (ExcludeLocations, world_type.location_name_groups)]:
+                    composite = composite_group(groups)
+                    if composite is None:
+                        continue
+                    (group, names) = composite
+                    self.assertNotIn(group, list(groups))
+                    option = option_type.from_any([group])
+                    option.verify(world_type, "Player", PlandoOptions.none)
+                    self.assertEqual(option.value, names)
+
+                composite = composite_group(world_type.item_name_groups)
+                if composite is not None:
+                    self.assertIn(composite[0], world_type.all_item_and_group_names)
@@ -0,0 +1,40 @@
+import unittest
+
+from test.general import setup_solo_multiworld
+
+from . import wad_world_types
+from ..model.LocationTable import LocationTable
+
+
+class TestLocationTable(unittest.TestCase):
+    def test_select_matches_location_filters(self):
+        """
+        Selecting locations from the table should give the same results as
+        checking each location individually.
+        """
+        if not LocationTable.available():
+            self.skipTest("numpy not installed")
+        world_types = wad_world_types()
+        if not world_types:
+            self.skipTest("no wad apworlds installed")
+
+        for world_type in world_types:
+            with self.subTest(game=world_type.game):
+                wad = setup_solo_multiworld(world_type).worlds[1].wad_logic
+                table = wad.location_table
+                self.assertIsNotNone(table)
+                locations = list(wad.all_locations())
+                for spawn_filter in (0, 0x03, 0x08):
+                    for reachable in (False, True):
+                        for default_enabled in (False, True):
+                            self.assertEqual(
+                                table.select(
+                                    spawn_filter=spawn_filter, reachable=reachable,
+                                    default_enabled=default_enabled, include_secrets=True),
+                                [
+                                    loc for loc in locations
+                                    if (not spawn_filter or loc.spawn_filter & spawn_filter)
+                                    and not (reachable and loc.unreachable)
+                                    and not (default_enabled and not loc.is_default_enabled(True))
+                                ],
+                                f"spawn_filter={spawn_filter}, reachable={reachable}, default_enabled={default_enabled}")
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from ..model.LogicCache import STALE_TMP_AGE, LogicCache
+
+
+class TestLogicCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = LogicCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_survives_write_errors(self):
+        with patch("os.replace", side_effect=PermissionError("entry is open")):
+            self.cache.put("wad", "pkg", "logic", "abcd", {"value": 1})
+        self.assertFalse(self.cache.contains("wad", "pkg", "logic", "abcd"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+        self.cache.put("wad", "pkg", "logic", "abcd", {"value": 1})
+        self.assertEqual(self.cache.get("wad", "pkg", "logic", "abcd"), {"value": 1})
+
+    def test_evict_removes_stale_temporaries(self):
+        prefix = self.cache.prefix("wad", "pkg", "logic")
+        stale = os.path.join(self.tmp.name, f"{prefix}old.pickle1234.tmp")
+        fresh = os.path.join(self.tmp.name, f"{prefix}new.pickle5678.tmp")
+        other = os.path.join(self.tmp.name, f"{self.cache.prefix('other', 'pkg', 'logic')}old.pickle1234.tmp")
+        for path in (stale, fresh, other):
+            open(path, "wb").close()
+        then = time.time() - STALE_TMP_AGE - 60
+        os.utime(stale, (then, then))
+        os.utime(other, (then, then))
+
+        self.cache.put("wad", "pkg", "logic", "abcd", {"value": 1})
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(other))
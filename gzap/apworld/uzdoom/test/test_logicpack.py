@@ -0,0 +1,82 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from . import source_wads
+from ..model.logicpack import LogicPack, build_logicpack, minimize_keysets, read_text_records
+
+
+def text_records(files):
+    return [
+        (evt, payload)
+        for file in files
+        for evt, payload, _ in read_text_records(file)
+    ]
+
+def without_defaults(evt, payload):
+    # The pack only records that an item is secret, not that it isn't.
+    if evt == "AP-ITEM" and payload.get("secret") is False:
+        payload = {k: v for k, v in payload.items() if k != "secret"}
+    return (evt, payload)
+
+def tuned_checks(records):
+    """
+    Collapse a stream of AP-CHECK records into {pos: (name, region, unreachable,
+    keysets)}, following the same rules DoomLocation uses when loading tuning.
+    """
+    checks = {}
+    for evt, payload in records:
+        if evt != "AP-CHECK":
+            continue
+        keys = payload.get("keys")
+        region = payload.get("region")
+        unreachable = payload.get("unreachable")
+        if keys is None and region is None and unreachable is None:
+            continue
+        check = checks.setdefault(json.dumps(payload["pos"]), {
+            "name": payload.get("name"), "region": None, "unreachable": None, "keysets": set(),
+        })
+        if region:
+            check["region"] = region
+        elif check["region"]:
+            continue
+        if unreachable is not None:
+            check["unreachable"] = unreachable
+        if keys is not None:
+            check["keysets"].add(frozenset(k if "/" in k else "key/"+k for k in keys))
+    return {
+        pos: (check["name"], check["region"], check["unreachable"], frozenset(minimize_keysets(check["keysets"])))
+        for pos, check in checks.items()
+    }
+
+
+class TestLogicPack(unittest.TestCase):
+    def test_round_trip(self):
+        wads = source_wads()
+        if not wads:
+            self.skipTest("wad logic sources not available")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, logic, tuning in wads:
+                with self.subTest(wad=name):
+                    path = Path(tmp) / f"{name}.logicpack"
+                    build_logicpack(path, logic, tuning)
+                    pack = LogicPack(path)
+                    self.assertEqual(pack.wad_name, logic[0].name.split(".")[0])
+
+                    # Logic is stored record-for-record.
+                    self.assertEqual(
+                        [without_defaults(evt, payload) for evt, payload in text_records(logic)],
+                        [(evt, payload) for evt, payload, _ in pack.logic.records()])
+
+                    # Tuning is condensed, so compare what it means instead:
+                    # non-check records are kept in order, and each location
+                    # ends up with the same keys, region, and reachability.
+                    text_tuning = text_records(tuning)
+                    pack_tuning = [(evt, payload) for evt, payload, _ in pack.tuning.records()]
+                    self.assertEqual(
+                        [record for record in text_tuning if record[0] != "AP-CHECK"],
+                        [record for record in pack_tuning if record[0] != "AP-CHECK"])
+                    self.assertEqual(tuned_checks(text_tuning), tuned_checks(pack_tuning))
+                    self.assertEqual(pack.ntuning > 0, bool(tuning))
@@ -0,0 +1,57 @@
+import unittest
+
+from . import source_wads
+from ..model import records
+from ..model.logicpack import read_text_records
+
+
+def available_backends():
+    return [backend() for backend in records.BACKENDS.values() if backend]
+
+# Records that every backend should reject, and why.
+MALFORMED = [
+    ("unknown field", "AP-SECRET", '{"pos": ["MAP01", 0], "colour": "red"}'),
+    ("missing field", "AP-KEY", '{"tag": "Red", "typename": "RedCard", "scopename": "MAP01", "cluster": 0}'),
+    ("wrong type", "AP-MAP", '{"map": "MAP01", "checksum": 1, "info": {}}'),
+    ("bool as int", "AP-KEY", '{"tag": "Red", "typename": "RedCard", "scopename": "MAP01", "cluster": true, "maps": []}'),
+    ("wrong element type", "AP-SCAN", '{"flags": ["pretuning", 1]}'),
+    ("wrong value type", "AP-MAP", '{"map": "MAP01", "checksum": "x", "info": {}, "monsters": {"Imp": "2"}}'),
+    ("not an object", "AP-SCAN", '["pretuning"]'),
+    ("bad JSON", "AP-SCAN", '{"flags": [}'),
+]
+
+WELL_FORMED = [
+    ("AP-SCAN", '{"flags": []}'),
+    ("AP-ITEM", '{"category": "key", "typename": "RedCard", "tag": "Red", "pos": ["MAP01", 1, 2.5, 0], "skill": [1, 2, 3], "secret": true}'),
+    ("AP-CHECK", '{"id": null, "name": "MAP01 - Red", "pos": ["MAP01", 1, 2.5, 0], "keys": ["RedCard"], "unreachable": false}'),
+    ("AP-MAP", '{"map": "MAP01", "checksum": "x", "info": {"is_lobby": false}, "monsters": {"Imp": 2}}'),
+    ("AP-GOAL", '{"anything": ["goes", 1]}'),
+]
+
+
+class TestRecordBackends(unittest.TestCase):
+    def test_backends_reject_the_same_records(self):
+        for backend in available_backends():
+            for (why, evt, text) in MALFORMED:
+                with self.subTest(backend=backend.name, case=why):
+                    with self.assertRaises(records.RecordSchemaError):
+                        backend.decode(evt, text)
+
+    def test_backends_decode_the_same_records(self):
+        backends = available_backends()
+        expected = [records.JSONBackend().decode(evt, text) for evt, text in WELL_FORMED]
+        for backend in backends:
+            with self.subTest(backend=backend.name):
+                self.assertEqual([backend.decode(evt, text) for evt, text in WELL_FORMED], expected)
+
+        if len(backends) < 2:
+            return
+        for name, logic, tuning in source_wads():
+            for file in logic + tuning:
+                with self.subTest(wad=name, file=file.name):
+                    decoded = [
+                        [(evt, payload) for evt, payload, _ in read_text_records(file, backend.decode)]
+                        for backend in backends
+                    ]
+                    for other in decoded[1:]:
+                        self.assertEqual(decoded[0], other)
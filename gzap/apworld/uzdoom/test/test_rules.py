@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+
+from BaseClasses import CollectionState
+from test.general import setup_solo_multiworld
+from worlds.AutoWorld import AutoWorldRegister
+
+from . import wad_world_types
+from ..model import rules
+
+
+def rule_results(locations, state):
+    return {loc.name: loc.access_rule(state) for loc in locations}
+
+def setup_with_backend(world_type, backend, seed):
+    """
+    Like setup_solo_multiworld, but the world uses the given rule backend rather
+    than the default one.
+    """
+    mixins = tuple(mixin for mixin in backend.world_mixins if not issubclass(world_type, mixin))
+    variant = type(f"{world_type.__name__}_{backend.name}", (*mixins, world_type), {
+        "rule_backend": backend,
+        "item_name_to_id": world_type.item_name_to_id,
+        "location_name_to_id": world_type.location_name_to_id,
+        "item_name_groups": world_type.item_name_groups,
+        "location_name_groups": world_type.location_name_groups,
+    })
+    # AP creates worlds from the registered world type for the game, so the
+    # variant needs to stand in for it while we set up.
+    with patch.dict(AutoWorldRegister.world_types, {world_type.game: variant}):
+        return setup_solo_multiworld(variant, seed=seed)
+
+def access_rules(multiworld):
+    """All of player 1's locations and entrances, by name."""
+    spots = {}
+    for region in multiworld.get_regions(1):
+        for loc in region.locations:
+            spots[f"location {loc.name}"] = loc
+        for entrance in region.exits:
+            spots[f"entrance {entrance.name}"] = entrance
+    return spots
+
+
+class TestRuleInvalidation(unittest.TestCase):
+    def test_collect_and_remove_update_rules(self):
+        """
+        Rules may remember their results in the state, so collecting or
+        removing an item through the world has to make them forget them.
+        """
+        world_types = wad_world_types()
+        if not world_types:
+            self.skipTest("no wad apworlds installed")
+
+        for world_type in world_types:
+            with self.subTest(game=world_type.game):
+                multiworld = setup_solo_multiworld(world_type)
+                world = multiworld.worlds[1]
+                locations = multiworld.get_locations(1)
+                state = CollectionState(multiworld)
+                before = rule_results(locations, state)
+
+                # Collect progression items one at a time until one of them
+                # changes the result of some rule.
+                for item in multiworld.itempool:
+                    if not item.advancement:
+                        continue
+                    self.assertTrue(world.collect(state, item))
+                    after = rule_results(locations, state)
+                    if after != before:
+                        break
+                    before = after
+                else:
+                    self.fail("No item in the pool changed the result of any rule")
+
+                self.assertTrue(world.remove(state, item))
+                self.assertEqual(rule_results(locations, state), before)
+
+
+class TestRuleBackends(unittest.TestCase):
+    # How many times to compare the backends' results while collecting items.
+    CHECKPOINTS = 10
+
+    def test_backends_agree(self):
+        if not rules.BACKENDS["builder"]:
+            self.skipTest("rule builder not available")
+        world_types = wad_world_types()
+        if not world_types:
+            self.skipTest("no wad apworlds installed")
+
+        for world_type in world_types:
+            with self.subTest(game=world_type.game):
+                multiworlds = [
+                    setup_with_backend(world_type, backend, seed=1)
+                    for backend in (rules.ClosureRuleCache, rules.BuilderRuleCache)]
+                for multiworld,backend in zip(multiworlds, ("closure", "builder")):
+                    self.assertEqual(multiworld.worlds[1].rule_cache.name, backend)
+                pools = [multiworld.itempool for multiworld in multiworlds]
+                self.assertEqual([item.name for item in pools[0]], [item.name for item in pools[1]])
+                spots = [access_rules(multiworld) for multiworld in multiworlds]
+                self.assertEqual(spots[0].keys(), spots[1].keys())
+
+                states = [CollectionState(multiworld) for multiworld in multiworlds]
+                progression = [i for i,item in enumerate(pools[0]) if item.advancement]
+                stride = max(1, len(progression) // self.CHECKPOINTS)
+                for step,index in enumerate(progression):
+                    for pool,state in zip(pools, states):
+                        state.collect(pool[index], True)
+                    if step % stride and step != len(progression) - 1:
+                        continue
+                    (closure, builder) = (
+                        {name: spot.access_rule(state) for name,spot in named.items()}
+                        for named,state in zip(spots, states))
+                    self.assertEqual(closure, builder, f"after collecting {step+1} items")
@@ -0,0 +1,24 @@
+import os
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+from ..model.SpatialIndex import DEFAULT_TOLERANCE, tuning_tolerance
+
+
+class TestTuningTolerance(unittest.TestCase):
+    def tolerance(self, value):
+        with patch.dict(os.environ, {"GZAP_TUNING_TOLERANCE": value}), redirect_stdout(StringIO()) as out:
+            return (tuning_tolerance(), out.getvalue())
+
+    def test_valid_values_are_used(self):
+        self.assertEqual(self.tolerance("0"), (0.0, ""))
+        self.assertEqual(self.tolerance("3.5"), (3.5, ""))
+
+    def test_invalid_values_fall_back_to_default(self):
+        for value in ("two", "-1", "nan", "inf"):
+            with self.subTest(value=value):
+                (tolerance, output) = self.tolerance(value)
+                self.assertEqual(tolerance, DEFAULT_TOLERANCE)
+                self.assertIn("GZAP_TUNING_TOLERANCE", output)
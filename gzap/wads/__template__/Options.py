@@ -18,8 +18,7 @@ from worlds.AutoWorld import WebWorld
 
 uzdoom = sys.modules['worlds.uzdoom']
 model = sys.modules['worlds.uzdoom.model']
-included_logic = model.init_wads(__package__)
-wad = included_logic.wad
+manifest = model.init_manifest(__package__)
 
 
 ###############################################################################
@@ -74,19 +73,19 @@ class StartingLevels(OptionSet):
     - add more starting maps here.
 
     If doing the latter, the apworld's best guess at what to set this to is:
-    {wad.default_solo_starting_maps()}
+    {manifest.default_solo_starting_maps}
     """
-    if wad.default_solo_starting_maps() else ""
+    if manifest.default_solo_starting_maps else ""
     )
     display_name = "Starting levels"
-    default = sorted(map.map for map in wad.default_starting_maps())
+    default = sorted(manifest.default_starting_maps)
 
-if wad.get_flag('use_hub_logic'):
+if manifest.use_hub_logic():
     class StartWithKeys(Toggle):
         """Forced off because this WAD uses hub logic."""
         default = False
         visibility = Visibility.none
-elif model.tuning_files(wad.package, wad.name):
+elif manifest.has_tuning:
     class StartWithKeys(Toggle):
         """
         If enabled, you will start with all the keys for your starting_levels.
@@ -107,7 +106,7 @@ class IncludedLevels(OptionSet):
     Levels to randomize. By default this is all levels in the wad.
     """
     display_name = "Included levels"
-    default = sorted(wad.maps.keys())
+    default = sorted(manifest.map_names)
 
 class StartWithAllMaps(Toggle):
     """
@@ -151,8 +150,8 @@ class WinMapCount(Range):
     """
     display_name = "Number of maps to win"
     range_start = 0
-    range_end = len(wad.all_winnable_map_names())
-    default = len(wad.all_winnable_map_names())
+    range_end = len(manifest.winnable_map_names)
+    default = len(manifest.winnable_map_names)
 
 class WinMapNames(OptionSet):
     """
@@ -162,23 +161,19 @@ class WinMapNames(OptionSet):
     levels.
     """
     display_name = "Specific maps to win"
-    default = sorted([map for map in wad.all_boss_map_names()])
-    valid_keys = sorted([map for map in wad.all_winnable_map_names()])
+    default = sorted(manifest.boss_map_names)
+    valid_keys = sorted(manifest.winnable_map_names)
 
 
 ###############################################################################
 # Combat logic
 ###############################################################################
 
-def nrof_global_weapons(wad):
-    return len({
-        item.name() for item in wad.items()
-        if item.has_category('weapon') and not item.map})
+def nrof_global_weapons(manifest):
+    return len(manifest.global_weapons)
 
-def nrof_local_weapons(wad):
-    return len({
-        item.name() for item in wad.items()
-        if item.has_category('weapon') and item.map})
+def nrof_local_weapons(manifest):
+    return len(manifest.local_weapons)
 
 class PerMapWeaponUnlocks(Toggle):
     __doc__ = f"""
@@ -189,14 +184,14 @@ class PerMapWeaponUnlocks(Toggle):
     The `max_weapon_copies` setting is ignored when this is enabled. There will
     always be one copy of each weapon per map.
 
-    In this wad, with default settings, this will add {nrof_local_weapons(wad) - nrof_global_weapons(wad)} progression items to
+    In this wad, with default settings, this will add {nrof_local_weapons(manifest) - nrof_global_weapons(manifest)} progression items to
     the pool. If turning it on, you may need to add additional locations by
     enabling small or medium items, unless you are playing in a multiworld with
     other games that can absorb extra progression items.
     """
     default = False
 
-if wad.has_combat_logic_hints():
+if manifest.has_combat_logic_hints:
     class CombatLogicMode(Choice):
         """
         How the combat logic system works.
@@ -274,8 +269,8 @@ class LevelOrderBias(Range):
     display_name = "Level order bias"
     range_start = 0
     range_end = 100
-    default = 25 if not wad.use_hub_logic() else 0
-    visibility = Visibility.all if not wad.use_hub_logic() else Visibility.none
+    default = 25 if not manifest.use_hub_logic() else 0
+    visibility = Visibility.all if not manifest.use_hub_logic() else Visibility.none
 
 class LocalWeaponBias(Range):
     """
@@ -353,13 +348,13 @@ class FullPersistence(Toggle):
 def items(*categories):
     return {
         name for category in categories
-        for name in included_logic.item_categories_to_names.get(category, [])
+        for name in manifest.item_name_groups.get(category, [])
     }
 
 def locations(*categories):
     return {
         name for category in categories
-        for name in included_logic.location_categories_to_names.get(category, [])
+        for name in manifest.location_name_groups.get(category, [])
     }
 
 def nrof(*categories):
@@ -380,11 +375,8 @@ This wad contains {nrof(size)} {size} items ({nrof(size+'-secret')} in secrets):
 """
 
 def sized_names(size, category):
-    # We do this rather than using nrof/names because the categories_to_names
-    # maps are very particular about what order you put the category names in
-    # when constructing composite keys.
-    fqins = items(size) & items(category)
-    nlocs = len(locations(size) & locations(category))
+    fqins = items(f'{size}-{category}')
+    nlocs = nrof(f'{size}-{category}')
     return f'{size} ({nlocs}): {', '.join(sorted(fqins))}.\n' if len(fqins) else ''
 
 def kind_docs(kind):
@@ -529,8 +521,8 @@ class MaxWeaponCopies(Range):
     """
     display_name = "Max weapon copies"
     range_start = 0
-    range_end = len(wad.maps)
-    default = ceil(len(wad.maps)/8)
+    range_end = len(manifest.map_names)
+    default = ceil(len(manifest.map_names)/8)
 
 class IncludedItemCategories(OptionList):
     """
@@ -688,7 +680,7 @@ class UZDoomOptions(PerGameCommonOptions):
     start_inventory_from_pool: StartInventoryPool
 
 class UZDoomWeb(WebWorld):
-  game = f"UZDoom ({wad.name})"
+  game = f"UZDoom ({manifest.name})"
   option_groups = [
     OptionGroup("Starting Conditions", [
         SpawnFilter, StartingLevels, StartWithKeys, IncludedLevels, StartWithAllMaps, UZDoomStartInventory,
@@ -13,8 +13,14 @@ if 'worlds.uzdoom' not in sys.modules:
 
 uzdoom = sys.modules['worlds.uzdoom']
 model = sys.modules['worlds.uzdoom.model']
-included_logic = model.init_wads(__package__)
-wad = included_logic.wad
+manifest = model.init_manifest(__package__)
+
+def __getattr__(name):
+  # The full logic for the wad is loaded only when something actually needs it,
+  # e.g. the client looking up locations or a world being created for it.
+  if name == 'wad':
+    return model.init_wads(__package__).wad
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 from .Options import UZDoomOptions, UZDoomWeb
 
@@ -22,16 +28,16 @@ if uzdoom.VERSION != VERSION:
   print(f"Warning: {__package__}: version mismatch between core apworld ({uzdoom.VERSION}) and wad apworld ({VERSION})")
 
 class UZDoomWorld___WAD__(uzdoom.UZDoomWorld):
-  game = f"UZDoom ({wad.name})"
+  game = f"UZDoom ({manifest.name})"
   mod_version = VERSION
   hidden = False
-  wad_logic = wad
+  wad_package = __package__
   options_dataclass = UZDoomOptions
   options: UZDoomOptions
   web: WebWorld = UZDoomWeb()
 
   # Used by AP itself
-  item_name_to_id = model.unified_item_map(included_logic)
-  item_name_groups = model.unified_item_groups(included_logic)
-  location_name_to_id = model.unified_location_map(included_logic)
-  location_name_groups = model.unified_location_groups(included_logic)
+  item_name_to_id = manifest.item_name_to_id.copy()
+  item_name_groups = manifest.item_name_groups.copy()
+  location_name_to_id = manifest.location_name_to_id.copy()
+  location_name_groups = manifest.location_name_groups.copy()